@@ -3,7 +3,14 @@ import json
 import sys
 
 def is_fully_identical(entry):
-    return entry.get("Identical Functions") == entry.get("Total Functions Analyzed")
+    # -1 (or no counts at all) means the function diff is unknown: timeout, tool failure
+    total = entry.get("Total Functions Analyzed", -1)
+    if entry.get("Analysis Tier", "radiff2") != "radiff2":
+        # Fallback tiers may only see the exported functions, any changed section counts
+        sections = entry.get("Fallback Analysis", {}).get("sections", {})
+        if sections.get("changed") or sections.get("added") or sections.get("removed"):
+            return False
+    return total >= 0 and entry.get("Identical Functions") == total
 
 def has_capabilities(entry):
     return bool(entry.get("rc_metadata", {}).get("capabilities"))
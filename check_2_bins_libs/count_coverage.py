@@ -34,7 +34,14 @@ def count_apk_json_entries(apk_json_path: Path) -> int:
         return len(data)
 
 def is_fully_identical(entry):
-    return entry.get("Identical Functions") == entry.get("Total Functions Analyzed")
+    # -1 (or no counts at all) means the function diff is unknown: timeout, tool failure
+    total = entry.get("Total Functions Analyzed", -1)
+    if entry.get("Analysis Tier", "radiff2") != "radiff2":
+        # Fallback tiers may only see the exported functions, any changed section counts
+        sections = entry.get("Fallback Analysis", {}).get("sections", {})
+        if sections.get("changed") or sections.get("added") or sections.get("removed"):
+            return False
+    return total >= 0 and entry.get("Identical Functions") == total
 
 def count_bin_and_lib_json_entries(bin_json_path: Path):
     with open(bin_json_path) as f:
@@ -49,6 +56,7 @@ def count_bin_and_lib_json_entries(bin_json_path: Path):
         rc_bin_count = 0
         rc_lib_count = 0
         hardening_diff_count = 0
+        fast_path_count = 0
 
         for key, entry in data.items():
             is_lib = key.endswith(".so")
@@ -58,6 +66,9 @@ def count_bin_and_lib_json_entries(bin_json_path: Path):
             else:
                 total_bin_count += 1
 
+            if entry.get("Analysis Tier") == "fast-path":
+                fast_path_count += 1
+
             if is_fully_identical(entry):
                 continue  # skip fully identical entries from further stats
 
@@ -81,7 +92,7 @@ def count_bin_and_lib_json_entries(bin_json_path: Path):
             bin_count, lib_count,
             tee_count, tee_lib_count,
             rc_bin_count, rc_lib_count, hardening_diff_count,
-            total_bin_count, total_lib_count
+            total_bin_count, total_lib_count, fast_path_count
         )
 
 def show_stats(name, json_count, actual_count):
@@ -111,7 +122,7 @@ def main():
         bin_json_count, lib_json_count,
         tee_count, tee_lib_count,
         rc_bin_count, rc_lib_count, hardening_diff_count,
-        total_bin_json_count, total_lib_json_count
+        total_bin_json_count, total_lib_json_count, fast_path_count
     ) = count_bin_and_lib_json_entries(bin_json_path)
 
     show_stats("ELF Binaries (non-.so)", bin_json_count, actual_bin_count)
@@ -128,6 +139,7 @@ def main():
     print("Total JSON entries including identical:")
     print(f"  Total binaries in JSON:                {total_bin_json_count}")
     print(f"  Total libraries in JSON:               {total_lib_json_count}")
+    print(f"  Identical code, radiff2 skipped:       {fast_path_count}")
 
 if __name__ == "__main__":
     main()
@@ -1,52 +1,157 @@
-import subprocess
-from collections import defaultdict
+import os
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import json
 
-def get_needed_libs(binary_path):
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from elf_reader import ElfFile, ELF_MAGIC
+
+# Library directories the Android linker searches, relative to the partition root.
+# Binaries resolve through their own partition first, then fall back to system.
+LIB_DIRS = {
+    True: ("lib64", "system/lib64"),
+    False: ("lib", "system/lib"),
+}
+FALLBACK_PARTITIONS = ("system", "system_ext", "product", "vendor", "odm")
+
+def read_elf_info(path):
     try:
-        result = subprocess.run(
-            ["readelf", "-d", binary_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            check=True,
-        )
-    except Exception as e:
-        print(f"Error reading {binary_path}: {e}")
-        return []
-
-    needed_libs = []
-    for line in result.stdout.splitlines():
-        line = line.strip()
-        if "(NEEDED)" in line:
-            # Example line:
-            # 0x0000000000000001 (NEEDED)             Shared library: [liblog.so]
-            start = line.find('[')
-            end = line.find(']')
-            if start != -1 and end != -1 and end > start:
-                libname = line[start+1:end]
-                needed_libs.append(libname)
-    return needed_libs
-
-def main(binaries_file):
-    lib_to_bins = defaultdict(list)
+        with open(path, "rb") as f:
+            if f.read(4) != ELF_MAGIC:
+                return None
+        with ElfFile(path) as elf:
+            return {
+                "path": path,
+                "is64": elf.is64,
+                "machine": elf.machine,
+                "needed": elf.needed,
+                "soname": elf.soname,
+            }
+    except (OSError, ValueError) as e:
+        print(f"Error reading {path}: {e}", file=sys.stderr)
+        return None
+
+def get_needed_libs(binary_path):
+    info = read_elf_info(binary_path)
+    return info["needed"] if info else []
+
+def collect_shared_libs(root):
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if ".so" in name:
+                path = os.path.join(dirpath, name)
+                if os.path.isfile(path) and not os.path.islink(path):
+                    paths.append(path)
+    return sorted(paths)
+
+def partition_of(path, root):
+    rel = os.path.relpath(path, root)
+    return rel.split(os.sep, 1)[0]
+
+def search_rank(lib_path, requester_partition, root):
+    rel_dir = os.path.dirname(os.path.relpath(lib_path, root))
+    parts = rel_dir.split(os.sep, 1)
+    partition, sub = parts[0], parts[1] if len(parts) > 1 else ""
+    in_search_dir = sub in LIB_DIRS[True] or sub in LIB_DIRS[False]
+    if partition == requester_partition:
+        partition_rank = 0
+    elif partition in FALLBACK_PARTITIONS:
+        partition_rank = 1 + FALLBACK_PARTITIONS.index(partition)
+    else:
+        partition_rank = 1 + len(FALLBACK_PARTITIONS)
+    return (partition_rank, 0 if in_search_dir else 1, lib_path)
 
+class LibraryResolver:
+    def __init__(self, root, infos):
+        self.root = root
+        self.by_name = defaultdict(list)
+        for info in infos:
+            self.by_name[os.path.basename(info["path"])].append(info)
+            if info["soname"] and info["soname"] != os.path.basename(info["path"]):
+                self.by_name[info["soname"]].append(info)
+        self._resolved = {}
+
+    def resolve(self, name, requester):
+        key = (name, requester["is64"], requester["machine"], partition_of(requester["path"], self.root))
+        if key not in self._resolved:
+            candidates = [
+                info for info in self.by_name.get(name, [])
+                if info["is64"] == requester["is64"] and info["machine"] == requester["machine"]
+            ]
+            if candidates:
+                best = min(candidates, key=lambda info: search_rank(info["path"], key[3], self.root))
+                self._resolved[key] = best
+            else:
+                self._resolved[key] = None
+        return self._resolved[key]
+
+def transitive_closure(binary_info, resolver):
+    """Yields every library name reachable from binary_info through DT_NEEDED."""
+    seen_names = set()
+    seen_paths = {binary_info["path"]}
+    queue = deque([binary_info])
+    while queue:
+        current = queue.popleft()
+        for name in current["needed"]:
+            if name not in seen_names:
+                seen_names.add(name)
+                yield name
+            lib = resolver.resolve(name, binary_info)
+            if lib is not None and lib["path"] not in seen_paths:
+                seen_paths.add(lib["path"])
+                queue.append(lib)
+
+def main(binaries_file, root=None, jobs=None, graph_out=None):
     with open(binaries_file, "r") as f:
-        for line in f:
-            binary_path = line.strip()
-            if not binary_path:
-                continue
+        binaries = [line.strip() for line in f if line.strip()]
+
+    lib_to_bins = defaultdict(list)
 
-            libs = get_needed_libs(binary_path)
-            for lib in libs:
+    if root is None:
+        # No firmware root to resolve against: direct NEEDED entries only
+        for binary_path in binaries:
+            for lib in get_needed_libs(binary_path):
                 lib_to_bins[lib].append(binary_path)
+        print(json.dumps(lib_to_bins, indent=2))
+        return
+
+    root = os.path.abspath(root)
+    lib_paths = collect_shared_libs(root)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        lib_infos = [info for info in executor.map(read_elf_info, lib_paths, chunksize=64) if info]
+        bin_infos = list(executor.map(read_elf_info, binaries, chunksize=16))
+
+    resolver = LibraryResolver(root, lib_infos)
+    print(f"Indexed {len(lib_infos)} shared libraries under {root}", file=sys.stderr)
+
+    for binary_path, info in zip(binaries, bin_infos):
+        if info is None:
+            continue
+        for lib in transitive_closure(info, resolver):
+            lib_to_bins[lib].append(binary_path)
+
+    if graph_out:
+        graph = {}
+        for info in lib_infos + [i for i in bin_infos if i]:
+            graph[info["path"]] = {}
+            for name in info["needed"]:
+                lib = resolver.resolve(name, info)
+                graph[info["path"]][name] = lib["path"] if lib else None
+        with open(graph_out, "w") as f:
+            json.dump(graph, f, indent=2)
 
     print(json.dumps(lib_to_bins, indent=2))
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} binaries_list.txt")
-        sys.exit(1)
+    import argparse
+    parser = argparse.ArgumentParser(description="Map shared libraries (transitively) to the .rc binaries that load them")
+    parser.add_argument("binaries_list", help="File with one rc binary path per line")
+    parser.add_argument("--root", help="Firmware root used to resolve DT_NEEDED entries; without it only direct dependencies are reported")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for parsing ELF files (default: all cores)")
+    parser.add_argument("--graph", help="Also dump the resolved dependency graph to this JSON file")
+    args = parser.parse_args()
 
-    main(sys.argv[1])
+    main(args.binaries_list, args.root, args.jobs, args.graph)
@@ -11,4 +11,4 @@ bin_json=$3
 lib_json_map=$4
 
 python3 check_2_bins_libs/find_init_binaries.py $rc_dir $bin_list $bin_json
-python3 check_2_bins_libs/elf_libs.py $bin_list > $lib_json_map
\ No newline at end of file
+python3 check_2_bins_libs/elf_libs.py $bin_list --root $rc_dir > $lib_json_map
\ No newline at end of file
@@ -8,13 +8,5 @@ fi
 path_to_grep=$1
 output_json=$2
 
-file_list_xml=$(grep -rni "group gid" "$path_to_grep" | cut -d: -f1 | grep -E '\.xml$' | sort -u)
-
-echo "Processing the following XML files:"
-printf "%s\n" "$file_list_xml"
-echo
-
-# Feed each XML file to the updated Python script
-while IFS= read -r xml_file; do
-    python3 2_gid_mapping.py "$xml_file" "$output_json"
-done <<< "$file_list_xml"
\ No newline at end of file
+# One process finds the XMLs mentioning "group gid", parses them and writes the merged map once
+python3 2_gid_mapping.py "$path_to_grep" "$output_json"
@@ -1,35 +1,61 @@
 #!/usr/bin/env python3
+import argparse
 import sys
 import xml.etree.ElementTree as ET
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import repeat
 import json
 import os
 
-if len(sys.argv) != 3:
-    print("Usage: 2_gid_mapping.py <input_xml_file> <output_json_file>")
-    sys.exit(1)
+import fact_cache
 
-input_file = sys.argv[1]
-output_json = sys.argv[2]
+# What `grep -rni "group gid"` looked for, lowercased
+GID_MARKER = b"group gid"
 
-# Final map: gid -> list of permissions
-gid_map = defaultdict(set)  # Use set to avoid duplicates
 
-# Load existing file if present
-if os.path.exists(output_json):
+def mentions_gid(path):
     try:
-        with open(output_json, "r") as f:
-            existing = json.load(f)
-            for gid, perms in existing.items():
-                gid_map[gid].update(perms)
-    except Exception as e:
-        print(f"Error reading existing JSON file {output_json}: {e}", file=sys.stderr)
+        with open(path, "rb") as f:
+            return GID_MARKER in f.read().lower()
+    except OSError:
+        return False
+
+
+def scan_dir(path):
+    """(subdirectories, candidate XMLs) of one directory. Symlinks are skipped like grep -r does."""
+    dirs, xmls = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.name.endswith(".xml") and entry.is_file(follow_symlinks=False) and mentions_gid(entry.path):
+                    xmls.append(entry.path)
+    except OSError as e:
+        print(f"Error scanning {path}: {e}", file=sys.stderr)
+    return dirs, xmls
+
 
-# Parse input XML
-try:
-    tree = ET.parse(input_file)
-    root = tree.getroot()
+def find_gid_xmls(root, threads=None):
+    """Every *.xml under root mentioning "group gid", sorted. Directories are scanned in parallel."""
+    found = []
+    # Directory listings and small reads, threads keep plenty of them in flight
+    with ThreadPoolExecutor(max_workers=threads or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        pending = {executor.submit(scan_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirs, xmls = future.result()
+                found.extend(xmls)
+                pending.update(executor.submit(scan_dir, d) for d in dirs)
+    return sorted(found)
 
+
+def gid_pairs(input_file):
+    """List of (gid, permission) pairs declared by one permissions XML."""
+    pairs = []
+    root = ET.parse(input_file).getroot()
     for perm in root.findall('permission'):
         perm_name = perm.get('name')
         if perm_name is None:
@@ -38,21 +64,97 @@ try:
         for group in perm.findall('group'):
             gid = group.get('gid')
             if gid:
-                gid_map[gid].add(perm_name)
+                pairs.append((gid, perm_name))
+    return pairs
+
+
+def parse_gids(input_file, cache_dir=None):
+    try:
+        return fact_cache.cached_facts("gid_groups", input_file, gid_pairs, cache_dir)
+    except Exception as e:
+        print(f"Error parsing {input_file}: {e}", file=sys.stderr)
+        return []
+
+
+def collect_inputs(inputs, list_file=None, threads=None):
+    """Explicit XML files as given, directories searched for candidate XMLs, plus the paths listed in list_file."""
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files.extend(find_gid_xmls(path, threads))
+        else:
+            files.append(path)
+    if list_file:
+        f = sys.stdin if list_file == "-" else open(list_file)
+        with f:
+            files.extend(line.strip() for line in f if line.strip())
+    # Same file reached twice still counts once
+    return list(dict.fromkeys(files))
+
+
+def merge_pairs(results):
+    # Final map: gid -> set of permissions, in file order
+    gid_map = defaultdict(set)
+    for pairs in results:
+        for gid, perm_name in pairs:
+            gid_map[gid].add(perm_name)
+    return gid_map
+
+
+def gid_map_of(files, workers=None, cache_dir=None):
+    if workers == 1:
+        return merge_pairs(map(parse_gids, files, repeat(cache_dir)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_pairs(executor.map(parse_gids, files, repeat(cache_dir), chunksize=8))
+
+
+def load_existing(output_json, gid_map):
+    if not os.path.exists(output_json):
+        return
+    try:
+        with open(output_json, "r") as f:
+            for gid, perms in json.load(f).items():
+                gid_map[gid].update(perms)
+    except Exception as e:
+        print(f"Error reading existing JSON file {output_json}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Map GIDs to the permissions granting them, from the permission XMLs of a firmware tree")
+    parser.add_argument("inputs", nargs="+", help="Permission XML files and/or directories to search for XMLs mentioning \"group gid\"")
+    parser.add_argument("output_json", help="Merged {gid: [permissions]} map, written once")
+    parser.add_argument("--list", help="File with one more XML path per line, - for stdin")
+    parser.add_argument("--merge", action="store_true", help="Add to the map already in output_json instead of replacing it")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: one per core, 1 parses in-process)")
+    parser.add_argument("--threads", type=int, default=None, help="Directory scanning threads")
+    fact_cache.add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    files = collect_inputs(args.inputs, args.list, args.threads)
+    print(f"Processing {len(files)} XML files:")
+    print("\n".join(files))
+    print()
 
-except Exception as e:
-    print(f"Error parsing {input_file}: {e}", file=sys.stderr)
+    gid_map = defaultdict(set)
+    if args.merge:
+        load_existing(args.output_json, gid_map)
+    cache_dir = fact_cache.cache_dir_of(args)
+    stats_before = fact_cache.cache_stats(cache_dir)
+    for gid, perms in gid_map_of(files, args.workers, cache_dir).items():
+        gid_map[gid].update(perms)
+    fact_cache.print_stats_delta(cache_dir, stats_before)
 
-# Print results (for debug or visual check)
-for gid, permissions in gid_map.items():
-    print(f"GID: {gid}")
-    for perm in sorted(permissions):
-        print(f"  - Permission: {perm}")
+    # Print results (for debug or visual check)
+    for gid, permissions in gid_map.items():
+        print(f"GID: {gid}")
+        for perm in sorted(permissions):
+            print(f"  - Permission: {perm}")
 
-# Write final merged map to output
-result = {gid: sorted(list(perms)) for gid, perms in gid_map.items()}
+    # Write final merged map to output
+    result = {gid: sorted(list(perms)) for gid, perms in gid_map.items()}
 
-with open(output_json, "w") as f:
-    json.dump(result, f, indent=2)
+    with open(args.output_json, "w") as f:
+        json.dump(result, f, indent=2)
 
-print(f"\nUpdated GID map written to {output_json}")
\ No newline at end of file
+    print(f"\nGID map of {len(files)} XML files written to {args.output_json}")
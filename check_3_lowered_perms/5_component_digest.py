@@ -3,66 +3,28 @@ import sys
 import json
 import os
 
-# Base protection levels (dominant scores)
-base_score = {
-    "normal": 10,
-    "dangerous": 20,
-    "signature": 30,
-    "signatureOrSystem": 30,
-    "internal": 40
-}
-
-flag_weights = {
-    "privileged": 5,
-    "appop": 2,
-    "runtime": 2,
-    "instant": 1,
-    "development": 1,
-    "verifier": 1,
-    "installer": 1,
-    "preinstalled": 1,
-    "vendorPrivileged": 3,
-    "pre23": 0.5,
-    "setup": 1,
-    "oem": 1,
-    "systemTextClassifier": 1,
-    "documenter": 1
-}
-
-def score_level(level_string):
-    if not level_string:
-        return base_score["normal"]
-    parts = [p.strip() for p in level_string.split('|') if p.strip()]
-    base = None
-    flags = []
-    for part in parts:
-        if part in base_score and base is None:
-            base = part
-        else:
-            flags.append(part)
-    base_val = base_score.get(base, base_score["normal"])
-    flag_val = sum(flag_weights.get(f, 1) for f in flags)
-    return base_val + flag_val
-
-def load_json(path):
-    with open(path) as f:
-        return json.load(f)
+from permission_model import PermissionModel
 
-def load_jsonl_levels(path):
-    levels = {}
+def load_component_map(path):
+    """
+    {apk: {"components": ...}} from the JSONL 5_parse_manifest.py appends, read line by line,
+    or from a single JSON object like manifest_facts.py writes. A later line for an APK wins.
+    """
     with open(path) as f:
+        first = f.readline()
+        if not first.strip():
+            return {}
+        try:
+            entry = json.loads(first)
+        except ValueError:
+            # Not one object per line: a whole (indented) JSON file
+            f.seek(0)
+            return json.load(f)
+        components = dict(entry)
         for line in f:
-            entry = json.loads(line)
-            levels[entry["permission_name"]] = entry["protection_level"]
-    return levels
-
-def load_protection_diff(path):
-    with open(path) as f:
-        summary = json.load(f)
-    return {
-        "increased": summary.get("increased", []),
-        "decreased": summary.get("decreased", [])
-    }
+            if line.strip():
+                components.update(json.loads(line))
+    return components
 
 def normalize_apk_path(path):
     # Normalize to just the relative path from /system/ or /vendor/
@@ -72,7 +34,7 @@ def normalize_apk_path(path):
             return path[idx:]
     return os.path.basename(path)  # fallback: just the APK filename
 
-def compare_components(old_map, new_map, perm_levels, diff_summary):
+def compare_components(old_map, new_map, model):
     result = {"increased": [], "decreased": []}
     component_types = ["activity", "service", "receiver", "provider"]
 
@@ -101,8 +63,8 @@ def compare_components(old_map, new_map, perm_levels, diff_summary):
                     new_perm = new_perms_dict.get(key)
 
                     if old_perm != new_perm:
-                        old_score = score_level(perm_levels.get(old_perm, "normal")) if old_perm else 0
-                        new_score = score_level(perm_levels.get(new_perm, "normal")) if new_perm else 0
+                        old_score = model.score(old_perm) if old_perm else 0
+                        new_score = model.score(new_perm) if new_perm else 0
 
                         if new_perm and not old_perm:
                             result["increased"].append({
@@ -142,45 +104,30 @@ def compare_components(old_map, new_map, perm_levels, diff_summary):
                             })
 
                 # Check unchanged permissions for protection level updates
-                for perm in set(new_perms_dict.values()):
-                    for direction in ["increased", "decreased"]:
-                        for entry in diff_summary[direction]:
-                            if entry["permission_name"] == perm:
-                                old_score = score_level(entry["old_level"])
-                                new_score = score_level(entry["new_level"])
-                                if new_score > old_score:
-                                    result["increased"].append({
-                                        "apk": apk,
-                                        "component": comp_name,
-                                        "type": comp_type,
-                                        "permission": perm,
-                                        "change": f"score {old_score} -> {new_score} (protection level change)"
-                                    })
-                                elif new_score < old_score:
-                                    result["decreased"].append({
-                                        "apk": apk,
-                                        "component": comp_name,
-                                        "type": comp_type,
-                                        "permission": perm,
-                                        "change": f"score {old_score} -> {new_score} (protection level change)"
-                                    })
-                                break
+                for perm, old_score, new_score in model.level_changes(set(new_perms_dict.values())):
+                    direction = "increased" if new_score > old_score else "decreased"
+                    result[direction].append({
+                        "apk": apk,
+                        "component": comp_name,
+                        "type": comp_type,
+                        "permission": perm,
+                        "change": f"score {old_score} -> {new_score} (protection level change)"
+                    })
 
     return result
 
 # --- Main ---
 if len(sys.argv) != 6:
-    print("Usage: 5_component_digest.py old.json new.json permissions.jsonl protection_diff_summary.json outfile.json")
+    print("Usage: 5_component_digest.py old.json[l] new.json[l] permissions.jsonl protection_diff_summary.json outfile.json")
     sys.exit(1)
 
 old_json, new_json, perm_jsonl, diff_json, outfile = sys.argv[1:]
 
-old_component_map = load_json(old_json)
-new_component_map = load_json(new_json)
-perm_levels = load_jsonl_levels(perm_jsonl)
-diff_summary = load_protection_diff(diff_json)
+old_component_map = load_component_map(old_json)
+new_component_map = load_component_map(new_json)
+model = PermissionModel.from_files(perm_jsonl, diff_json)
 
-summary = compare_components(old_component_map, new_component_map, perm_levels, diff_summary)
+summary = compare_components(old_component_map, new_component_map, model)
 
 with open(outfile, "w") as f:
     json.dump(summary, f, indent=2)
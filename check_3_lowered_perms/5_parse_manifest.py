@@ -3,7 +3,14 @@ import sys
 import argparse
 import xml.etree.ElementTree as ET
 import json
-import os
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import axml
+import fact_cache
+import manifest_facts
 
 ANDROID_NS = 'http://schemas.android.com/apk/res/android'
 
@@ -50,34 +57,71 @@ def extract_permissions_from_stdin(manifest_text, apk_path):
 
     return result
 
+def read_paths(paths, list_file):
+    """Command line paths, then one path per line of list_file ("-" for stdin, e.g. piped from find)."""
+    paths = list(paths)
+    if list_file:
+        f = sys.stdin if list_file == "-" else open(list_file)
+        with f:
+            paths.extend(line.strip() for line in f if line.strip())
+    return paths
+
+
+def decode_manifest(path):
+    if path.lower().endswith(".apk"):
+        return manifest_facts.decode_apk(path)
+    with open(path, "rb") as f:
+        return manifest_facts.manifest_facts(axml.parse(f.read()))
+
+
+def manifest_record(path, cache_dir=None):
+    """{apk path: {"components": ...}} for an APK or a manifest file (text or binary XML), None if it has no <application>."""
+    try:
+        facts = fact_cache.cached_facts("manifest", path, decode_manifest, cache_dir)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+        print(f"Failed to parse manifest for {path}: {e}", file=sys.stderr)
+        return None
+    return manifest_facts.component_permissions({path: facts}) or None
+
+
+def append_records(records, outfile):
+    """
+    Appends one JSON line per record, so adding an APK never rewrites what is already there.
+    A later line for the same APK replaces the earlier one when 5_component_digest.py reads it back.
+    """
+    count = 0
+    with open(outfile, "a") as f:
+        for record in records:
+            if record:
+                f.write(json.dumps(record) + "\n")
+                count += 1
+    return count
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--apk", required=True, help="Path to the source APK file")
-    parser.add_argument("--outfile", required=True, help="Path to the output JSON file")
+    parser.add_argument("paths", nargs="*", help="Batch mode: APKs or AndroidManifest.xml files (text or binary) to parse")
+    parser.add_argument("--list", help="Batch mode: file with one APK/manifest path per line, - for stdin")
+    parser.add_argument("--apk", help="Single mode: path of the APK whose text manifest is on stdin")
+    parser.add_argument("--outfile", required=True, help="Path to the output JSONL file, appended to")
+    parser.add_argument("--workers", type=int, default=None, help="Batch mode worker processes (default: one per core, 1 parses in-process)")
+    fact_cache.add_cache_arguments(parser)
     args = parser.parse_args()
 
-    manifest_text = sys.stdin.read()
-    parsed = extract_permissions_from_stdin(manifest_text, args.apk)
-
-    if not parsed:
+    if args.apk:
+        # One manifest from stdin, as printed by apkanalyzer
+        parsed = extract_permissions_from_stdin(sys.stdin.read(), args.apk)
+        if append_records([parsed], args.outfile):
+            print(f"Manifest permission info of {args.apk} appended to {args.outfile}")
         sys.exit(0)
 
-    # Load existing data if the file exists
-    if os.path.exists(args.outfile):
-        try:
-            with open(args.outfile, "r") as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"Failed to load existing JSON file: {e}", file=sys.stderr)
-            data = {}
+    paths = read_paths(args.paths, args.list)
+    if not paths:
+        parser.error("give APK/manifest paths, --list or --apk")
+    cache_dir = fact_cache.cache_dir_of(args)
+    if args.workers == 1:
+        count = append_records(map(manifest_record, paths, repeat(cache_dir)), args.outfile)
     else:
-        data = {}
-
-    # Add or update entry
-    data.update(parsed)
-
-    # Write back to the file
-    with open(args.outfile, "w") as f:
-        json.dump(data, f, indent=2)
-
-    print(f"Updated manifest permission info written to {args.outfile}")
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            count = append_records(executor.map(manifest_record, paths, repeat(cache_dir), chunksize=8), args.outfile)
+    print(f"Manifest permission info of {count} of {len(paths)} APKs appended to {args.outfile}")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import struct
+import sys
+import xml.etree.ElementTree as ET
+
+# Chunk types of Android's compiled XML (frameworks/base/libs/androidfw/include/androidfw/ResourceTypes.h)
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_NAMESPACE_TYPE = 0x0100
+RES_XML_END_NAMESPACE_TYPE = 0x0101
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_CDATA_TYPE = 0x0104
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+
+UTF8_FLAG = 0x100
+NO_INDEX = 0xFFFFFFFF
+
+TYPE_REFERENCE, TYPE_ATTRIBUTE, TYPE_STRING, TYPE_FLOAT = 0x01, 0x02, 0x03, 0x04
+TYPE_INT_DEC, TYPE_INT_HEX, TYPE_INT_BOOLEAN = 0x10, 0x11, 0x12
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+
+# android:* attribute resource ids, for manifests whose attribute names were stripped or obfuscated
+ANDROID_ATTRIBUTES = {
+    0x01010001: "label",
+    0x01010003: "name",
+    0x01010006: "permission",
+    0x01010007: "readPermission",
+    0x01010008: "writePermission",
+    0x01010009: "protectionLevel",
+    0x0101000A: "permissionGroup",
+    0x0101000E: "enabled",
+    0x01010010: "exported",
+    0x01010011: "process",
+    0x0101001B: "grantUriPermissions",
+    0x0101001C: "priority",
+}
+
+
+def read_string_pool(data, offset):
+    header_size, chunk_size = struct.unpack_from("<HI", data, offset + 2)
+    count, _, flags, strings_start, _ = struct.unpack_from("<IIIII", data, offset + 8)
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    base = offset + strings_start
+    utf8 = flags & UTF8_FLAG
+    strings = []
+    for string_offset in offsets:
+        pos = base + string_offset
+        if utf8:
+            # UTF-16 length first (unused), then the UTF-8 byte length, each 1 or 2 bytes
+            for _ in range(2):
+                length = data[pos]
+                pos += 1
+                if length & 0x80:
+                    length = ((length & 0x7F) << 8) | data[pos]
+                    pos += 1
+            strings.append(bytes(data[pos:pos + length]).decode("utf-8", errors="replace"))
+        else:
+            length = struct.unpack_from("<H", data, pos)[0]
+            pos += 2
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", data, pos)[0]
+                pos += 2
+            strings.append(bytes(data[pos:pos + 2 * length]).decode("utf-16-le", errors="replace"))
+    return strings
+
+
+def format_value(strings, raw_value, data_type, value):
+    # Same spelling as `aapt2 dump xmltree` for the types the checks look at
+    if raw_value != NO_INDEX:
+        return strings[raw_value]
+    if data_type == TYPE_STRING:
+        return strings[value]
+    if data_type == TYPE_INT_BOOLEAN:
+        return "true" if value else "false"
+    if data_type == TYPE_INT_DEC:
+        return str(struct.unpack("<i", struct.pack("<I", value))[0])
+    if data_type == TYPE_INT_HEX:
+        return f"0x{value:08x}"
+    if data_type == TYPE_REFERENCE:
+        return f"@0x{value:08x}"
+    if data_type == TYPE_ATTRIBUTE:
+        return f"?0x{value:08x}"
+    if data_type == TYPE_FLOAT:
+        return repr(struct.unpack("<f", struct.pack("<I", value))[0])
+    return f"0x{value:08x}"
+
+
+def parse(data):
+    """
+    Decodes a compiled (binary) Android XML file into an ElementTree element.
+    Namespaced attributes are keyed "{uri}name" like ElementTree does for text XML.
+    Plain text XML is parsed as is. Raises ValueError for anything else.
+    """
+    if data[:1] == b"<" or data[:5] == b"\xef\xbb\xbf<?":
+        try:
+            return ET.fromstring(data)
+        except ET.ParseError as e:
+            raise ValueError(f"bad text XML: {e}")
+    try:
+        return _parse_binary(memoryview(data))
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"truncated binary XML: {e}")
+
+
+def _parse_binary(data):
+    chunk_type, header_size, total_size = struct.unpack_from("<HHI", data, 0)
+    if chunk_type != RES_XML_TYPE:
+        raise ValueError(f"not a binary XML file (chunk type 0x{chunk_type:04x})")
+    total_size = min(total_size, len(data))
+
+    strings = []
+    resource_ids = []
+    root = None
+    stack = []
+    offset = header_size
+    while offset + 8 <= total_size:
+        chunk_type, header_size, chunk_size = struct.unpack_from("<HHI", data, offset)
+        if chunk_size < 8:
+            raise ValueError(f"bad chunk size {chunk_size} at 0x{offset:x}")
+
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = read_string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f"<{(chunk_size - header_size) // 4}I", data, offset + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            body = offset + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from("<IIHHH", data, body)
+            element = ET.Element(strings[name])
+            for i in range(attr_count):
+                attr = body + attr_start + i * attr_size
+                ns, attr_name, raw_value, _, _, data_type, value = struct.unpack_from("<IIIHBBI", data, attr)
+                key = strings[attr_name] if attr_name != NO_INDEX else ""
+                if attr_name < len(resource_ids) and resource_ids[attr_name] in ANDROID_ATTRIBUTES:
+                    key = ANDROID_ATTRIBUTES[resource_ids[attr_name]]
+                    ns_uri = ANDROID_NS
+                else:
+                    ns_uri = strings[ns] if ns != NO_INDEX else None
+                if ns_uri:
+                    key = f"{{{ns_uri}}}{key}"
+                element.set(key, format_value(strings, raw_value, data_type, value))
+            if stack:
+                stack[-1].append(element)
+            elif root is None:
+                root = element
+            stack.append(element)
+        elif chunk_type == RES_XML_END_ELEMENT_TYPE:
+            if stack:
+                stack.pop()
+        elif chunk_type == RES_XML_CDATA_TYPE:
+            if stack:
+                text = struct.unpack_from("<I", data, offset + header_size)[0]
+                stack[-1].text = (stack[-1].text or "") + strings[text]
+        # Namespace chunks only matter through the attributes' ns indices
+
+        offset += chunk_size
+
+    if root is None:
+        raise ValueError("binary XML without elements")
+    return root
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: axml.py <binary xml file>")
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        tree = parse(f.read())
+    ET.indent(tree)
+    print(ET.tostring(tree, encoding="unicode"))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# result_cache lives at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from result_cache import ResultCache, file_sha256, format_stats_delta
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/thesis/facts")
+
+# Bump a kind's version when its extractor changes what it records, so stale entries are never served
+FACT_VERSIONS = {
+    "protection_levels": 2,  # protection_levels.py, per JAR/APK
+    "manifest": 1,           # manifest_facts.py, per APK: broadcasts, intents, permissions, components
+    "gid_groups": 1,         # 2_gid_mapping.py, per permissions XML
+}
+
+
+def cache_key(kind, path):
+    material = {"kind": kind, "version": FACT_VERSIONS[kind], "file": file_sha256(path)}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def open_cache(cache_dir):
+    # One per worker process and directory
+    return ResultCache(cache_dir)
+
+
+def cached_facts(kind, path, extract, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    extract(path), looked up by the file's SHA-256 first, so an archive or XML unchanged
+    between firmware versions is only ever decoded once. Without cache_dir, always extracts.
+    Exceptions from extract propagate and nothing is stored.
+    """
+    if not cache_dir:
+        return extract(path)
+    cache = open_cache(cache_dir)
+    key = cache_key(kind, path)
+    value = cache.get(key)
+    if value is None:
+        value = extract(path)
+        cache.put(key, value)
+    return value
+
+
+def cache_stats(cache_dir):
+    return open_cache(cache_dir).stats() if cache_dir else None
+
+
+def print_stats_delta(cache_dir, before):
+    if cache_dir and before is not None:
+        print("[CACHE] " + format_stats_delta(before, cache_stats(cache_dir)))
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Fact cache shared by the check 3 extractors, keyed by file SHA-256")
+    parser.add_argument("--no-cache", action="store_true", help="Decode every file, ignore the fact cache")
+
+
+def cache_dir_of(args):
+    return None if args.no_cache else args.cache_dir
+
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import axml
+import fact_cache
+
+COMPONENT_TAGS = ("activity", "service", "receiver", "provider")
+PERMISSION_KEYS = ("permission", "readPermission", "writePermission")
+# Only these inherit <application android:permission>, providers don't
+INHERITS_APP_PERMISSION = ("activity", "service", "receiver")
+
+
+def android_attr(elem, name):
+    return elem.get(f"{{{axml.ANDROID_NS}}}{name}")
+
+
+def find_apks(root):
+    """Every *.apk under root (case-insensitive, like find -iname), in a stable order."""
+    apks = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(".apk"):
+                apks.append(os.path.join(dirpath, name))
+    return apks
+
+
+def read_manifest(apk_path):
+    with zipfile.ZipFile(apk_path) as apk:
+        return axml.parse(apk.read("AndroidManifest.xml"))
+
+
+def manifest_facts(manifest):
+    """Everything checks 3, 4 and 5 need from one decoded AndroidManifest.xml."""
+    facts = {
+        "package": manifest.get("package"),
+        "protected_broadcasts": [android_attr(e, "name") for e in manifest.iter("protected-broadcast") if android_attr(e, "name")],
+        "actions": [android_attr(e, "name") for e in manifest.iter("action") if android_attr(e, "name")],
+        "permissions": [
+            {"name": android_attr(e, "name"), "protectionLevel": android_attr(e, "protectionLevel")}
+            for e in manifest.findall("permission") if android_attr(e, "name")
+        ],
+        "application": None,
+        "components": [],
+    }
+
+    app = manifest.find("application")
+    if app is None:
+        return facts
+    facts["application"] = {"permission": android_attr(app, "permission")}
+    for comp in app:
+        if comp.tag not in COMPONENT_TAGS:
+            continue
+        component = {
+            "type": comp.tag,
+            "name": android_attr(comp, "name"),
+            "exported": android_attr(comp, "exported"),
+            "has_intent_filter": comp.find("intent-filter") is not None,
+        }
+        for key in PERMISSION_KEYS:
+            if android_attr(comp, key):
+                component[key] = android_attr(comp, key)
+        facts["components"].append(component)
+    return facts
+
+
+def decode_apk(apk_path):
+    return manifest_facts(read_manifest(apk_path))
+
+
+def apk_facts(apk_path, cache_dir=None):
+    try:
+        return fact_cache.cached_facts("manifest", apk_path, decode_apk, cache_dir)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def map_facts(apk_paths, executor=None, cache_dir=None):
+    """Facts of each APK in apk_paths order. With an executor, all of them are submitted right away."""
+    if executor is None:
+        return map(apk_facts, apk_paths, repeat(cache_dir))
+    return executor.map(apk_facts, apk_paths, repeat(cache_dir), chunksize=8)
+
+
+def collect_facts(apk_paths, results):
+    facts = {}
+    for apk_path, result in zip(apk_paths, results):
+        facts[apk_path] = result
+        if "error" in result:
+            print(f"Skipping {apk_path}: {result['error']}", file=sys.stderr)
+    return facts
+
+
+def extract_facts(root, executor=None, cache_dir=None):
+    """{apk path: facts} for every APK under root, each manifest decoded once."""
+    apk_paths = find_apks(root)
+    return collect_facts(apk_paths, map_facts(apk_paths, executor, cache_dir))
+
+
+# The formats the check 3/4/5 digests read, as the per-APK shell loops used to write them
+
+def broadcasts_text(facts):
+    lines = []
+    for apk_path, apk in facts.items():
+        lines.append(f"### {apk_path}")
+        lines.extend(apk.get("protected_broadcasts", []))
+    return "\n".join(lines) + "\n"
+
+
+def intents_text(facts):
+    lines = []
+    for apk_path, apk in facts.items():
+        lines.append(f"== {apk_path} ==")
+        lines.extend(apk.get("actions", []))
+    return "\n".join(lines) + "\n"
+
+
+def exported(component):
+    # Not declared: exported exactly when the component has an intent filter
+    if component["exported"] is not None:
+        return component["exported"]
+    return "true" if component["has_intent_filter"] else "false"
+
+
+def visibility_map(facts):
+    result = {}
+    for apk_path, apk in facts.items():
+        # Only android:permission, like the former 4_get_visibility.sh: its case-sensitive /permission/ never
+        # matched the readPermission/writePermission attribute lines
+        components = [
+            {"type": c["type"], "name": c["name"], "exported": exported(c), "permission": c.get("permission", "")}
+            for c in apk.get("components", []) if c["name"]
+        ]
+        if components:
+            result[apk_path] = components
+    return result
+
+
+def component_permissions(facts):
+    result = {}
+    for apk_path, apk in facts.items():
+        if not apk.get("application"):
+            continue
+        app_permission = apk["application"]["permission"]
+        components = {tag: {} for tag in COMPONENT_TAGS}
+        for c in apk["components"]:
+            if not c["name"]:
+                continue
+            permissions = {key: c[key] for key in PERMISSION_KEYS if key in c}
+            if c["type"] in INHERITS_APP_PERMISSION and "permission" not in permissions and app_permission:
+                permissions["permission"] = app_permission
+            components[c["type"]][c["name"]] = permissions
+        result[apk_path] = {"components": components}
+    return result
+
+
+def write_outputs(facts, facts_path=None, broadcasts=None, intents=None, visibility=None, components=None):
+    # Everything is written from the ordered facts in this process, so the files don't depend on the pool
+    if facts_path:
+        with open(facts_path, "w") as f:
+            json.dump(facts, f, indent=2)
+    if broadcasts:
+        with open(broadcasts, "w") as f:
+            f.write(broadcasts_text(facts))
+    if intents:
+        with open(intents, "w") as f:
+            f.write(intents_text(facts))
+    if visibility:
+        with open(visibility, "w") as f:
+            json.dump(visibility_map(facts), f, indent=2)
+    if components:
+        with open(components, "w") as f:
+            json.dump(component_permissions(facts), f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Decode every APK's AndroidManifest.xml under a firmware tree once and write the facts checks 3, 4 and 5 use")
+    parser.add_argument("path", help="Firmware tree to search for APKs")
+    parser.add_argument("facts", help="Per-firmware facts output (JSON, one entry per APK)")
+    parser.add_argument("--broadcasts", help="Also write the protected broadcasts list for 3_check_undeclared_broadcasts.py")
+    parser.add_argument("--intents", help="Also write the intent actions list for 3_check_undeclared_broadcasts.py")
+    parser.add_argument("--visibility", help="Also write the component visibility JSON for 4_visibility_digest.py")
+    parser.add_argument("--components", help="Also write the component permissions JSON for 5_component_digest.py")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core, 1 decodes in-process)")
+    fact_cache.add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    cache_dir = fact_cache.cache_dir_of(args)
+    stats_before = fact_cache.cache_stats(cache_dir)
+    if args.workers == 1:
+        facts = extract_facts(args.path, cache_dir=cache_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            facts = extract_facts(args.path, executor, cache_dir)
+    fact_cache.print_stats_delta(cache_dir, stats_before)
+    write_outputs(facts, args.facts, args.broadcasts, args.intents, args.visibility, args.components)
+    errors = sum(1 for apk in facts.values() if "error" in apk)
+    print(f"Decoded {len(facts) - errors} manifests ({errors} failed), facts written to {args.facts}")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fact_cache
+import manifest_facts
+
+
+def output_paths(out_dir, version):
+    """Where run_all_checks.sh expects the manifest-derived files of firmware version 1 or 2."""
+    prefix = os.path.join(out_dir, f"v{version}_")
+    return {
+        "facts_path": prefix + "manifest_facts.json",
+        "broadcasts": prefix + "broadcasts.txt",
+        "intents": prefix + "intents.txt",
+        "visibility": prefix + "visibility.txt",
+        "components": prefix + "components.json",
+    }
+
+
+def extract_versions(roots, workers=None, cache_dir=None):
+    """
+    Facts of every APK under each root, in the same order as a serial run. All APKs of all
+    versions go into one pool up front, so the tail of one version overlaps the next.
+    """
+    apk_lists = [manifest_facts.find_apks(root) for root in roots]
+    if workers == 1:
+        return [manifest_facts.collect_facts(apks, manifest_facts.map_facts(apks, cache_dir=cache_dir)) for apks in apk_lists]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = [manifest_facts.map_facts(apks, executor, cache_dir) for apks in apk_lists]
+        return [manifest_facts.collect_facts(apks, results) for apks, results in zip(apk_lists, pending)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract the manifest facts of both firmware versions for checks 3, 4 and 5 in one process pool")
+    parser.add_argument("path_1", help="Firmware tree of version 1")
+    parser.add_argument("path_2", help="Firmware tree of version 2")
+    parser.add_argument("out_dir", help="Directory for the v1_*/v2_* intermediate files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core, 1 runs serially)")
+    fact_cache.add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    cache_dir = fact_cache.cache_dir_of(args)
+    stats_before = fact_cache.cache_stats(cache_dir)
+    for version, facts in enumerate(extract_versions([args.path_1, args.path_2], args.workers, cache_dir), 1):
+        manifest_facts.write_outputs(facts, **output_paths(args.out_dir, version))
+        errors = sum(1 for apk in facts.values() if "error" in apk)
+        print(f"v{version}: decoded {len(facts) - errors} manifests ({errors} failed)")
+    fact_cache.print_stats_delta(cache_dir, stats_before)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import json
+import sys
+from functools import lru_cache
+
+# Base protection levels (dominant scores)
+base_score = {
+    "normal": 10,
+    "dangerous": 20,
+    "signature": 30,
+    "signatureOrSystem": 30,  # Deprecated but same meaning
+    "internal": 40            # Rare and undocumented
+}
+
+# Flag weights (minor modifiers)
+flag_weights = {
+    "privileged": 5,
+    "appop": 2,
+    "runtime": 2,
+    "instant": 1,
+    "development": 1,
+    "verifier": 1,
+    "installer": 1,
+    "preinstalled": 1,
+    "vendorPrivileged": 3,
+    "pre23": 0.5,
+    "setup": 1,
+    "oem": 1,
+    "systemTextClassifier": 1,
+    "documenter": 1
+}
+
+DIRECTIONS = ("increased", "decreased")
+
+
+@lru_cache(maxsize=None)
+def score_level(level_string):
+    if not level_string:
+        return base_score["normal"]  # Default to "normal" if unspecified
+
+    parts = [p.strip() for p in level_string.split('|') if p.strip()]
+    base = None
+    flags = []
+
+    for part in parts:
+        if part in base_score and base is None:
+            base = part
+        else:
+            flags.append(part)
+
+    base_val = base_score.get(base, base_score["normal"])
+    flag_val = sum(flag_weights.get(f, 1) for f in flags)
+
+    return base_val + flag_val
+
+
+def load_levels(path):
+    """{permission name: protection level} from a protection level JSONL, the last record of a name wins."""
+    levels = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            levels[entry["permission_name"]] = entry["protection_level"]
+    return levels
+
+
+def load_protection_diff(path):
+    with open(path) as f:
+        summary = json.load(f)
+    return {direction: summary.get(direction, []) for direction in DIRECTIONS}
+
+
+def protection_diff(old, new):
+    """Check 1 summary of two {permission: level} maps: increased, decreased, added and removed permissions."""
+    summary = {
+        "increased": [],
+        "decreased": [],
+        "added": [],
+        "removed": []
+    }
+    for perm, old_level in old.items():
+        if perm not in new:
+            summary["removed"].append({"permission_name": perm, "old_level": old_level})
+            continue
+        new_level = new[perm]
+        old_score = score_level(old_level)
+        new_score = score_level(new_level)
+        if new_score != old_score:
+            direction = "increased" if new_score > old_score else "decreased"
+            summary[direction].append({"permission_name": perm, "old_level": old_level, "new_level": new_level})
+    for perm, new_level in new.items():
+        if perm not in old:
+            summary["added"].append({"permission_name": perm, "new_level": new_level})
+    return summary
+
+
+class PermissionModel:
+    """
+    Protection levels of one firmware version and the check 1 diff, indexed by permission name.
+    Scores are computed once per permission; permissions without a known level score as "normal".
+    """
+
+    def __init__(self, levels, diff_summary=None):
+        self.levels = levels
+        self.scores = {perm: score_level(level) for perm, level in levels.items()}
+        self.default_score = score_level("normal")
+        # permission -> [(old score, new score)], at most one per direction, "increased" first
+        self.changes = {}
+        for direction in DIRECTIONS:
+            seen = set()
+            for entry in (diff_summary or {}).get(direction, []):
+                perm = entry["permission_name"]
+                if perm in seen:
+                    continue
+                seen.add(perm)
+                scores = (score_level(entry["old_level"]), score_level(entry["new_level"]))
+                self.changes.setdefault(perm, []).append(scores)
+
+    @classmethod
+    def from_files(cls, levels_path, diff_path=None):
+        return cls(load_levels(levels_path), load_protection_diff(diff_path) if diff_path else None)
+
+    def score(self, perm):
+        return self.scores.get(perm, self.default_score)
+
+    def total_score(self, perms):
+        return sum(self.score(p) for p in perms)
+
+    def level_changes(self, perms):
+        """(permission, old score, new score) for each of perms whose protection level score changed in the diff."""
+        for perm in perms:
+            for old_score, new_score in self.changes.get(perm, ()):
+                if old_score != new_score:
+                    yield perm, old_score, new_score
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: permission_model.py <protection level string>")
+        sys.exit(1)
+    print(score_level(sys.argv[1]))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import struct
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import axml
+import fact_cache
+
+# android:protectionLevel, frameworks/base/core/res/res/values/attrs_manifest.xml
+PROTECTION_BASES = {0: "normal", 1: "dangerous", 2: "signature", 3: "signatureOrSystem", 4: "internal"}
+PROTECTION_BASE_MASK = 0xF
+PROTECTION_FLAGS = (
+    (0x10, "privileged"), (0x20, "development"), (0x40, "appop"), (0x80, "pre23"),
+    (0x100, "installer"), (0x200, "verifier"), (0x400, "preinstalled"), (0x800, "setup"),
+    (0x1000, "instant"), (0x2000, "runtime"), (0x4000, "oem"), (0x8000, "vendorPrivileged"),
+    (0x10000, "textClassifier"), (0x20000, "wellbeing"), (0x40000, "documenter"),
+    (0x80000, "configurator"), (0x100000, "incidentReportApprover"), (0x200000, "appPredictor"),
+    (0x400000, "module"), (0x800000, "companion"), (0x1000000, "retailDemo"), (0x2000000, "recents"),
+    (0x4000000, "role"), (0x8000000, "knownSigner"),
+)
+
+# Only XML entries containing one of these can declare a protection level: the attribute name in
+# a UTF-8 or UTF-16 string pool, or its resource id in the resource map
+PROTECTION_LEVEL_MARKERS = (
+    b"protectionLevel",
+    "protectionLevel".encode("utf-16-le"),
+    struct.pack("<I", 0x01010009),
+)
+
+
+def format_protection_level(value):
+    """Flag names joined by "|" like apktool prints them, for the integer a compiled XML holds."""
+    try:
+        number = int(value, 16) if value.startswith("0x") else int(value)
+    except ValueError:
+        # Text XML already spells it out
+        return value
+    names = [PROTECTION_BASES.get(number & PROTECTION_BASE_MASK, hex(number & PROTECTION_BASE_MASK))]
+    names.extend(name for bit, name in PROTECTION_FLAGS if number & bit)
+    return "|".join(names)
+
+
+def find_archives(root):
+    """JARs first, then APKs, each in a stable order, like the jadx and apktool passes ran."""
+    jars, apks = [], []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(".jar"):
+                jars.append(os.path.join(dirpath, name))
+            elif name.endswith(".apk"):
+                apks.append(os.path.join(dirpath, name))
+    return jars + apks
+
+
+def is_candidate_name(name):
+    """Where a permission with its protection level can be declared: a manifest, or values resources left as XML."""
+    if os.path.basename(name) == "AndroidManifest.xml":
+        return True
+    parts = name.split("/")
+    return name.endswith(".xml") and len(parts) >= 2 and parts[-2].startswith("values") and "res" in parts[:-2]
+
+
+def candidate_xml(archive):
+    # Picked by name from the central directory first, only those entries are inflated
+    for info in archive.infolist():
+        if is_candidate_name(info.filename):
+            data = archive.read(info)
+            if os.path.basename(info.filename) == "AndroidManifest.xml" or any(m in data for m in PROTECTION_LEVEL_MARKERS):
+                yield info.filename, data
+
+
+def archive_protection_levels(path):
+    """{"permission_name", "protection_level"} records of every XML element in the archive declaring both."""
+    records = []
+    with zipfile.ZipFile(path) as archive:
+        for name, data in candidate_xml(archive):
+            try:
+                root = axml.parse(data)
+            except ValueError:
+                continue
+            for elem in root.iter():
+                perm_name = elem.get(f"{{{axml.ANDROID_NS}}}name")
+                level = elem.get(f"{{{axml.ANDROID_NS}}}protectionLevel")
+                if perm_name and level:
+                    records.append({"permission_name": perm_name, "protection_level": format_protection_level(level)})
+    return records
+
+
+def cached_protection_levels(path, cache_dir):
+    try:
+        return fact_cache.cached_facts("protection_levels", path, archive_protection_levels, cache_dir)
+    except (OSError, zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+        print(f"Skipping {path}: {e}", file=sys.stderr)
+        return []
+
+
+def extract(root, output, cache_dir=fact_cache.DEFAULT_CACHE_DIR, workers=None):
+    archives = find_archives(root)
+    stats_before = fact_cache.cache_stats(cache_dir)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(cached_protection_levels, archives, [cache_dir] * len(archives), chunksize=4)
+        count = 0
+        with open(output, "w") as f:
+            for archive, records in zip(archives, results):
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                count += len(records)
+                if records:
+                    print(f"{archive}: {len(records)} protection levels")
+    print(f"{count} protection levels from {len(archives)} archives written to {output}")
+    fact_cache.print_stats_delta(cache_dir, stats_before)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract permission protection levels from every JAR/APK under a tree without decompiling them")
+    parser.add_argument("path", help="Firmware tree to search for JARs and APKs")
+    parser.add_argument("output", help="Output JSONL, one {permission_name, protection_level} record per line")
+    fact_cache.add_cache_arguments(parser)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    extract(args.path, args.output, fact_cache.cache_dir_of(args), args.workers)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import fact_cache
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# full_bin_check.sh runs tree_diff.py here, the paths in check_2's diff are relative to it
+REPO_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# A step runs its command when an output is missing or older than an input, or when its
+# command or inputs differ from those of the run that wrote its outputs (see stamp_path).
+# Inputs produced by another step make it a dependency; directories count with their newest file.
+Step = namedtuple("Step", ["name", "command", "inputs", "outputs"])
+
+UP_TO_DATE, DONE, FAILED, SKIPPED = "up to date", "done", "FAILED", "skipped"
+
+
+def script(name):
+    return os.path.join(SCRIPT_DIR, name)
+
+
+def python(name, *args):
+    return [sys.executable, script(name), *args]
+
+
+# Every step given cache_args also depends on the cache code: a change there re-runs it
+CACHE_SCRIPTS = [script("fact_cache.py"), os.path.join(REPO_ROOT, "result_cache.py")]
+
+
+def extraction_steps(path_1, path_2, inter, cache_args=()):
+    """Full extraction of both trees: protection levels, GID maps and manifest facts."""
+    def i(name):
+        return os.path.join(inter, name)
+
+    manifest_outputs = [i(f"v{v}_{name}") for v in (1, 2) for name in (
+        "manifest_facts.json", "broadcasts.txt", "intents.txt", "visibility.txt", "components.json")]
+    steps = []
+    for v, path in ((1, path_1), (2, path_2)):
+        steps.append(Step(f"protection levels v{v}",
+                          python("protection_levels.py", path, i(f"v{v}_protection_level.jsonl"), *cache_args),
+                          [path, script("protection_levels.py"), script("axml.py"), *CACHE_SCRIPTS],
+                          [i(f"v{v}_protection_level.jsonl")]))
+        steps.append(Step(f"gid map v{v}",
+                          python("2_gid_mapping.py", path, i(f"v{v}_gid_map.json"), *cache_args),
+                          [path, script("2_gid_mapping.py"), *CACHE_SCRIPTS],
+                          [i(f"v{v}_gid_map.json")]))
+    # Decodes the APKs of both versions in one process pool
+    steps.append(Step("manifests",
+                      python("permission_checks.py", path_1, path_2, inter, *cache_args),
+                      [path_1, path_2, script("permission_checks.py"), script("manifest_facts.py"), script("axml.py"),
+                       *CACHE_SCRIPTS],
+                      manifest_outputs))
+    return steps
+
+
+def incremental_steps(path_1, path_2, inter, diff, v1_tree_facts=None, cache_args=(), diff_base=REPO_ROOT, diff_roots=None):
+    """
+    Extraction driven by check_2's diff: v1 is scanned once (or taken from the tree facts of an
+    earlier run), v2 reuses v1's facts for every file the diff doesn't list.
+    """
+    def i(name):
+        return os.path.join(inter, name)
+
+    def outputs(v):
+        return [i(f"v{v}_{name}") for name in (
+            "tree_facts.json", "protection_level.jsonl", "gid_map.json", "manifest_facts.json",
+            "broadcasts.txt", "intents.txt", "visibility.txt", "components.json")]
+
+    extractors = [script(name) for name in (
+        "tree_facts.py", "protection_levels.py", "manifest_facts.py", "2_gid_mapping.py", "axml.py")] + CACHE_SCRIPTS
+    if v1_tree_facts:
+        v1 = Step("tree facts v1",
+                  python("tree_facts.py", "write", v1_tree_facts, path_1, inter, "--version", "1", *cache_args),
+                  [v1_tree_facts, *extractors], outputs(1)[1:])
+    else:
+        v1 = Step("tree facts v1",
+                  python("tree_facts.py", "scan", path_1, inter, "--version", "1", *cache_args),
+                  [path_1, *extractors], outputs(1))
+    v1_facts = v1_tree_facts or i("v1_tree_facts.json")
+    v2 = Step("tree facts v2",
+              python("tree_facts.py", "update", v1_facts, path_2, diff, inter, "--version", "2", *cache_args,
+                     "--diff-base", diff_base, *(["--diff-roots", *diff_roots] if diff_roots else [])),
+              [v1_facts, diff, *extractors], outputs(2))
+    return [v1, v2]
+
+
+def check_steps(path_1, path_2, inter="intermediate_files", digests="result_digests", cache_args=(),
+                diff=None, v1_tree_facts=None, diff_base=REPO_ROOT, diff_roots=None):
+    """
+    The steps run_all_checks.sh ran one after another, with what each reads and writes.
+    cache_args go to the extractors sharing the fact cache. With check_2's diff, the
+    extraction is incremental.
+    """
+    def i(name):
+        return os.path.join(inter, name)
+
+    def d(name):
+        return os.path.join(digests, name)
+
+    if diff:
+        steps = incremental_steps(path_1, path_2, inter, diff, v1_tree_facts, cache_args, diff_base, diff_roots)
+    else:
+        steps = extraction_steps(path_1, path_2, inter, cache_args)
+    steps += [
+        Step("check 1",
+             python("1_protection_level_digest.py", i("v1_protection_level.jsonl"), i("v2_protection_level.jsonl"),
+                    d("1_protection_diff_digest.json")),
+             [i("v1_protection_level.jsonl"), i("v2_protection_level.jsonl"),
+              script("1_protection_level_digest.py"), script("permission_model.py")],
+             [d("1_protection_diff_digest.json")]),
+        Step("check 2",
+             python("2_gid_protection_digest.py", i("v1_gid_map.json"), i("v2_gid_map.json"),
+                    i("v2_protection_level.jsonl"), d("1_protection_diff_digest.json"), d("2_gid_digest.json")),
+             [i("v1_gid_map.json"), i("v2_gid_map.json"), i("v2_protection_level.jsonl"),
+              d("1_protection_diff_digest.json"), script("2_gid_protection_digest.py"), script("permission_model.py")],
+             [d("2_gid_digest.json")]),
+        Step("check 3",
+             python("3_check_undeclared_broadcasts.py", i("v1_broadcasts.txt"), i("v1_intents.txt"),
+                    i("v2_broadcasts.txt"), i("v2_intents.txt"), d("3_undeclared_broadcast_digest.json")),
+             [i("v1_broadcasts.txt"), i("v1_intents.txt"), i("v2_broadcasts.txt"), i("v2_intents.txt"),
+              script("3_check_undeclared_broadcasts.py")],
+             [d("3_undeclared_broadcast_digest.json")]),
+        Step("check 4",
+             python("4_visibility_digest.py", i("v1_visibility.txt"), i("v2_visibility.txt"), d("4_visibility_digest.json")),
+             [i("v1_visibility.txt"), i("v2_visibility.txt"), script("4_visibility_digest.py")],
+             [d("4_visibility_digest.json")]),
+        Step("check 5",
+             python("5_component_digest.py", i("v1_components.json"), i("v2_components.json"),
+                    i("v2_protection_level.jsonl"), d("1_protection_diff_digest.json"),
+                    d("5_component_visibility_digest.json")),
+             [i("v1_components.json"), i("v2_components.json"), i("v2_protection_level.jsonl"),
+              d("1_protection_diff_digest.json"), script("5_component_digest.py"), script("permission_model.py")],
+             [d("5_component_visibility_digest.json")]),
+    ]
+    return steps
+
+
+def dependencies(steps):
+    """{step name: names of the steps producing its inputs}"""
+    producers = {}
+    for step in steps:
+        for output in step.outputs:
+            producers[output] = step.name
+    return {step.name: {producers[p] for p in step.inputs if p in producers} for step in steps}
+
+
+class MtimeCache:
+    """Newest mtime of a file, or of any file under a directory, each path walked once per run."""
+
+    def __init__(self):
+        self.cache = {}
+
+    def newest(self, path):
+        if path not in self.cache:
+            self.cache[path] = self._newest(path)
+        return self.cache[path]
+
+    @staticmethod
+    def _newest(path):
+        if not os.path.isdir(path):
+            return os.path.getmtime(path) if os.path.exists(path) else None
+        newest = os.path.getmtime(path)
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    newest = max(newest, os.lstat(os.path.join(dirpath, name)).st_mtime)
+                except OSError:
+                    pass
+        return newest
+
+    def forget(self, paths):
+        for path in paths:
+            self.cache.pop(path, None)
+
+
+def stamp_path(step):
+    return step.outputs[0] + ".stamp"
+
+
+def step_stamp(step):
+    """Hash of the step's command and resolved inputs: another firmware pair never passes for this one."""
+    material = {"command": step.command, "inputs": [os.path.realpath(p) for p in step.inputs]}
+    return hashlib.sha256(json.dumps(material).encode()).hexdigest()
+
+
+def write_stamp(step):
+    with open(stamp_path(step), "w") as f:
+        f.write(step_stamp(step) + "\n")
+
+
+def up_to_date(step, mtimes):
+    try:
+        with open(stamp_path(step)) as f:
+            if f.read().strip() != step_stamp(step):
+                return False
+    except OSError:
+        return False
+    output_times = [os.path.getmtime(o) if os.path.exists(o) else None for o in step.outputs]
+    if None in output_times:
+        return False
+    input_times = [t for t in (mtimes.newest(p) for p in step.inputs) if t is not None]
+    return not input_times or max(input_times) <= min(output_times)
+
+
+def run_step(step, log_dir):
+    """Runs the step's command with its output in log_dir/<step>.log, returns (returncode, seconds)."""
+    for output in step.outputs:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    # Outputs half written by a failed run must not pass for up to date
+    if os.path.exists(stamp_path(step)):
+        os.remove(stamp_path(step))
+    log_path = os.path.join(log_dir, step.name.replace(" ", "_") + ".log")
+    print(f"[START] {step.name}", flush=True)
+    start = time.monotonic()
+    with open(log_path, "w") as log:
+        returncode = subprocess.run(step.command, stdout=log, stderr=subprocess.STDOUT).returncode
+    return returncode, time.monotonic() - start
+
+
+def log_tail(step, log_dir, lines=20):
+    log_path = os.path.join(log_dir, step.name.replace(" ", "_") + ".log")
+    with open(log_path, errors="replace") as f:
+        return "".join(f.readlines()[-lines:])
+
+
+def run_steps(steps, jobs=None, force=False, log_dir="intermediate_files/logs"):
+    """
+    Runs every step once all steps producing its inputs are finished, independent steps
+    in parallel. Returns {step name: (status, seconds)} in the order the steps finished.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    deps = dependencies(steps)
+    by_name = {step.name: step for step in steps}
+    mtimes = MtimeCache()
+    results = {}
+    waiting = [step.name for step in steps]
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=jobs or len(steps)) as executor:
+        def settle(name):
+            """Starts a step whose dependencies are finished. True when it was settled without running."""
+            step = by_name[name]
+            if any(results[d][0] in (FAILED, SKIPPED) for d in deps[name]):
+                results[name] = (SKIPPED, 0.0)
+                print(f"[SKIPPED] {name}: a step it depends on failed", flush=True)
+            elif not force and up_to_date(step, mtimes):
+                results[name] = (UP_TO_DATE, 0.0)
+                print(f"[UP TO DATE] {name}", flush=True)
+            else:
+                in_flight[executor.submit(run_step, step, log_dir)] = step
+                return False
+            return True
+
+        while waiting or in_flight:
+            settled = True
+            while settled:
+                settled = False
+                for name in [n for n in waiting if all(d in results for d in deps[n])]:
+                    waiting.remove(name)
+                    settled |= settle(name)
+            if not in_flight:
+                if waiting:
+                    raise ValueError(f"steps with dependency cycles: {', '.join(waiting)}")
+                break
+
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                step = in_flight.pop(future)
+                returncode, seconds = future.result()
+                mtimes.forget(step.outputs)
+                if returncode == 0:
+                    write_stamp(step)
+                    results[step.name] = (DONE, seconds)
+                    print(f"[DONE] {step.name} in {seconds:.1f}s", flush=True)
+                else:
+                    results[step.name] = (FAILED, seconds)
+                    print(f"[FAILED] {step.name} (exit {returncode}) after {seconds:.1f}s, log tail:", flush=True)
+                    print(log_tail(step, log_dir), flush=True)
+    return results
+
+
+def timing_report(results, wall):
+    lines = [f"  {'step':<22} {'status':<11} {'seconds':>8}"]
+    for name, (status, seconds) in results.items():
+        lines.append(f"  {name:<22} {status:<11} {seconds:8.1f}")
+    busy = sum(seconds for _, seconds in results.values())
+    lines.append(f"Total wall {wall:.1f}s for {busy:.1f}s of steps")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the permission checks as a dependency graph: independent steps in parallel, up to date ones skipped")
+    parser.add_argument("path_1", help="Firmware tree of version 1")
+    parser.add_argument("path_2", help="Firmware tree of version 2")
+    parser.add_argument("--jobs", type=int, default=None, help="Steps running at the same time (default: all that are ready)")
+    parser.add_argument("--force", action="store_true", help="Run every step, even when its outputs are up to date")
+    parser.add_argument("--diff", help="check_2's tree_diff.py records for these trees: extract v2 incrementally from v1's facts")
+    parser.add_argument("--v1-tree-facts", help="With --diff, v1's facts from an earlier run (e.g. its v2_tree_facts.json) instead of a scan of path_1")
+    parser.add_argument("--diff-base", default=REPO_ROOT,
+                        help="Directory the --diff paths are relative to (default: the repo root, where full_bin_check.sh runs)")
+    parser.add_argument("--diff-roots", nargs=2, metavar=("OLD", "NEW"),
+                        help="Trees the --diff was made on, when not path_1 and path_2 (relative to the current directory)")
+    fact_cache.add_cache_arguments(parser)
+    args = parser.parse_args()
+    if (args.v1_tree_facts or args.diff_roots) and not args.diff:
+        parser.error("--v1-tree-facts and --diff-roots need --diff")
+
+    cache_args = ["--no-cache"] if args.no_cache else ["--cache-dir", args.cache_dir]
+    steps = check_steps(args.path_1, args.path_2, cache_args=cache_args, diff=args.diff, v1_tree_facts=args.v1_tree_facts,
+                        diff_base=args.diff_base, diff_roots=args.diff_roots)
+    started = time.monotonic()
+    results = run_steps(steps, args.jobs, args.force)
+    print("\nStep timings:")
+    print(timing_report(results, time.monotonic() - started))
+    sys.exit(1 if any(status == FAILED for status, _ in results.values()) else 0)
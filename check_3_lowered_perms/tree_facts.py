@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import fact_cache
+import manifest_facts
+import permission_checks
+import protection_levels
+
+gid_mapping = importlib.import_module("2_gid_mapping")
+
+
+def list_files(root):
+    """(relative path, path) of every file under root, in the order the full extractors walk it."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, root), path
+
+
+def walk_key(rel):
+    # os.walk with sorted dirnames: a directory's files, then each subdirectory in turn
+    return tuple(os.path.dirname(rel).split(os.sep)), os.path.basename(rel)
+
+
+def is_candidate(rel):
+    name = os.path.basename(rel)
+    return name.endswith((".jar", ".xml")) or name.lower().endswith(".apk")
+
+
+def file_facts(root, rel, cache_dir=None):
+    """
+    What every check 3 extractor takes from one file, None when none of them reads it.
+    Symlinks are marked: tree_diff only sees their target path change, not the content behind it.
+    """
+    path = os.path.join(root, rel)
+    name = os.path.basename(rel)
+    facts = {}
+    if name.endswith((".jar", ".apk")):
+        facts["protection_levels"] = protection_levels.cached_protection_levels(path, cache_dir)
+    if name.lower().endswith(".apk"):
+        facts["manifest"] = manifest_facts.apk_facts(path, cache_dir)
+    # 2_gid_mapping.py skips symlinks, like grep -r
+    if name.endswith(".xml") and not os.path.islink(path) and gid_mapping.mentions_gid(path):
+        facts["gid_groups"] = gid_mapping.parse_gids(path, cache_dir)
+    if facts and os.path.islink(path):
+        facts["link"] = True
+    return facts or None
+
+
+def extract_files(root, rels, cache_dir=None, workers=None):
+    """{rel: facts} for those of rels that any extractor reads."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(file_facts, repeat(root), rels, repeat(cache_dir), chunksize=8)
+        return {rel: facts for rel, facts in zip(rels, results) if facts is not None}
+
+
+def scan_tree(root, cache_dir=None, workers=None):
+    """Facts of every file of a firmware tree, by path relative to the tree."""
+    rels = [rel for rel, _ in list_files(root) if is_candidate(rel)]
+    return {"root": root, "files": extract_files(root, rels, cache_dir, workers)}
+
+
+def read_diff(diff_path, base=None):
+    """
+    The tree_diff.py records check_2 wrote (JSON lines). Their paths are relative to the
+    directory tree_diff.py ran in; with base, they are made relative to the current one.
+    """
+    with open(diff_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if base:
+        for record in records:
+            for side in ("old", "new"):
+                if record[side]:
+                    record[side] = os.path.join(base, record[side])
+    return records
+
+
+def relative_to(path, root):
+    rel = os.path.relpath(path, root)
+    if rel == ".." or rel.startswith(".." + os.sep):
+        raise ValueError(f"{path} is not under {root}, give the trees the check_2 diff was made on with --diff-roots")
+    return rel
+
+
+def outside_roots(records, diff_roots):
+    """(path, root) of the first diff path not under its tree, None when they all are."""
+    for record in records:
+        for path, root in ((record["old"], diff_roots[0]), (record["new"], diff_roots[1])):
+            if path:
+                try:
+                    relative_to(path, root)
+                except ValueError:
+                    return path, root
+    return None
+
+
+def update_tree(old_tree, root, records, diff_roots, cache_dir=None, workers=None):
+    """
+    Facts of the new tree from those of the old one and the check_2 diff between them: only
+    the changed, added and renamed files (and symlinks) are extracted again, the rest is reused.
+    """
+    files = dict(old_tree["files"])
+    changed = set()
+    for record in records:
+        if record["old"]:
+            files.pop(relative_to(record["old"], diff_roots[0]), None)
+        if record["new"]:
+            changed.add(relative_to(record["new"], diff_roots[1]))
+    changed |= {rel for rel, facts in files.items() if facts.get("link")}
+
+    rels = sorted(rel for rel in changed if is_candidate(rel) and os.path.lexists(os.path.join(root, rel)))
+    for rel in changed:
+        files.pop(rel, None)
+    print(f"{len(records)} changed files in the diff: {len(rels)} files to extract again, {len(files)} reused")
+    files.update(extract_files(root, rels, cache_dir, workers))
+    return {"root": root, "files": files}
+
+
+def write_outputs(tree, root, out_dir, version):
+    """The v{version}_* files the full extractors write, byte for byte, from the facts of a tree."""
+    files = tree["files"]
+    order = sorted(files, key=walk_key)
+    prefix = os.path.join(out_dir, f"v{version}_")
+
+    # protection_levels.py: JARs, then APKs
+    archives = [rel for rel in order if rel.endswith(".jar")] + [rel for rel in order if rel.endswith(".apk")]
+    with open(prefix + "protection_level.jsonl", "w") as f:
+        for rel in archives:
+            for record in files[rel]["protection_levels"]:
+                f.write(json.dumps(record) + "\n")
+
+    # 2_gid_mapping.py: XMLs in path order, merged
+    xmls = sorted((rel for rel in files if "gid_groups" in files[rel]), key=lambda rel: os.path.join(root, rel))
+    gid_map = gid_mapping.merge_pairs(files[rel]["gid_groups"] for rel in xmls)
+    with open(prefix + "gid_map.json", "w") as f:
+        json.dump({gid: sorted(list(perms)) for gid, perms in gid_map.items()}, f, indent=2)
+
+    # permission_checks.py
+    facts = {os.path.join(root, rel): files[rel]["manifest"] for rel in order if "manifest" in files[rel]}
+    manifest_facts.write_outputs(facts, **permission_checks.output_paths(out_dir, version))
+
+
+def save_tree(tree, out_dir, version):
+    path = os.path.join(out_dir, f"v{version}_tree_facts.json")
+    with open(path, "w") as f:
+        json.dump(tree, f)
+    return path
+
+
+def load_tree(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-file facts of a firmware tree for the permission checks, from a full scan or from the previous version and check_2's diff")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="Extract the facts of every file of a tree")
+    scan.add_argument("path", help="Firmware tree")
+
+    update = sub.add_parser("update", help="Facts of the new tree from the old tree's facts and the check_2 diff")
+    update.add_argument("old_facts", help="v*_tree_facts.json of the version the diff starts from")
+    update.add_argument("path", help="Firmware tree the diff ends at")
+    update.add_argument("diff", help="tree_diff.py records written by full_bin_check.sh")
+    update.add_argument("--diff-roots", nargs=2, metavar=("OLD", "NEW"),
+                        help="Trees the diff was made on, when not the ones given here (default: old facts' root and path)")
+    update.add_argument("--diff-base", default=None,
+                        help="Directory tree_diff.py ran in, which the diff's paths are relative to (default: the current one)")
+
+    write = sub.add_parser("write", help="Only write the check inputs from existing tree facts")
+    write.add_argument("facts", help="v*_tree_facts.json, e.g. the v2 facts of the previous pair in a chain")
+    write.add_argument("path", help="Firmware tree the facts were taken from")
+
+    for command in (scan, update, write):
+        command.add_argument("out_dir", help="Directory for the v*_ intermediate files")
+        command.add_argument("--version", type=int, required=True, help="1 or 2, the prefix of the files written")
+        command.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+        fact_cache.add_cache_arguments(command)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    cache_dir = fact_cache.cache_dir_of(args)
+    stats_before = fact_cache.cache_stats(cache_dir)
+    if args.command == "scan":
+        tree = scan_tree(args.path, cache_dir, args.workers)
+    elif args.command == "update":
+        old_tree = load_tree(args.old_facts)
+        diff_roots = args.diff_roots or (old_tree["root"], args.path)
+        records = read_diff(args.diff, args.diff_base)
+        outside = outside_roots(records, diff_roots)
+        if outside:
+            parser.error(f"{outside[0]} from {args.diff} is not under {outside[1]}: the diff was made on other trees "
+                         f"or from another directory, give them with --diff-roots or --diff-base")
+        tree = update_tree(old_tree, args.path, records, diff_roots, cache_dir, args.workers)
+    else:
+        tree = load_tree(args.facts)
+    tree["root"] = args.path
+    write_outputs(tree, args.path, args.out_dir, args.version)
+    fact_cache.print_stats_delta(cache_dir, stats_before)
+    print(f"v{args.version}: facts of {len(tree['files'])} files written to {save_tree(tree, args.out_dir, args.version)}")
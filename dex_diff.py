@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import re
+import struct
+import sys
+import zipfile
+
+DEX_MAGIC = b"dex\n"
+NO_INDEX = 0xFFFFFFFF
+CLASSES_DEX_PATTERN = re.compile(r"^classes(\d*)\.dex$")
+
+# Index kinds an instruction can refer to. Indices are local to one .dex file and shift
+# whenever anything is added to its tables, so they get replaced by what they point at
+# before a method body is hashed.
+STRING, TYPE, FIELD, METHOD, PROTO, CALL_SITE, METHOD_HANDLE = range(7)
+
+# opcode -> (size in 16-bit code units, index kind or None, 32-bit index)
+OPCODES = {}
+
+
+def _ops(first, last, size, kind=None, wide=False):
+    for op in range(first, last + 1):
+        OPCODES[op] = (size, kind, wide)
+
+
+_ops(0x00, 0x01, 1)
+_ops(0x02, 0x02, 2)
+_ops(0x03, 0x03, 3)
+_ops(0x04, 0x04, 1)
+_ops(0x05, 0x05, 2)
+_ops(0x06, 0x06, 3)
+_ops(0x07, 0x07, 1)
+_ops(0x08, 0x08, 2)
+_ops(0x09, 0x09, 3)
+_ops(0x0A, 0x12, 1)
+_ops(0x13, 0x13, 2)
+_ops(0x14, 0x14, 3)
+_ops(0x15, 0x16, 2)
+_ops(0x17, 0x17, 3)
+_ops(0x18, 0x18, 5)
+_ops(0x19, 0x19, 2)
+_ops(0x1A, 0x1A, 2, STRING)
+_ops(0x1B, 0x1B, 3, STRING, wide=True)
+_ops(0x1C, 0x1C, 2, TYPE)
+_ops(0x1D, 0x1E, 1)
+_ops(0x1F, 0x20, 2, TYPE)
+_ops(0x21, 0x21, 1)
+_ops(0x22, 0x23, 2, TYPE)
+_ops(0x24, 0x25, 3, TYPE)
+_ops(0x26, 0x26, 3)
+_ops(0x27, 0x28, 1)
+_ops(0x29, 0x29, 2)
+_ops(0x2A, 0x2C, 3)
+_ops(0x2D, 0x3D, 2)
+_ops(0x3E, 0x43, 1)
+_ops(0x44, 0x51, 2)
+_ops(0x52, 0x6D, 2, FIELD)
+_ops(0x6E, 0x72, 3, METHOD)
+_ops(0x73, 0x73, 1)
+_ops(0x74, 0x78, 3, METHOD)
+_ops(0x79, 0x7A, 1)
+_ops(0x7B, 0x8F, 1)
+_ops(0x90, 0xAF, 2)
+_ops(0xB0, 0xCF, 1)
+_ops(0xD0, 0xE2, 2)
+_ops(0xE3, 0xF9, 1)
+_ops(0xFA, 0xFB, 4, METHOD)  # invoke-polymorphic(/range), proto index in the 4th unit
+_ops(0xFC, 0xFD, 3, CALL_SITE)
+_ops(0xFE, 0xFE, 2, METHOD_HANDLE)
+_ops(0xFF, 0xFF, 2, PROTO)
+
+PACKED_SWITCH_PAYLOAD = 0x0100
+SPARSE_SWITCH_PAYLOAD = 0x0200
+FILL_ARRAY_DATA_PAYLOAD = 0x0300
+
+
+def read_uleb128(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def read_sleb128(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                result -= 1 << shift
+            return result, offset
+
+
+class DexFile:
+    """
+    Minimal reader for the tables of a .dex image held in memory: strings, types,
+    protos, fields, methods, class definitions and code items.
+    """
+
+    def __init__(self, data):
+        if data[:4] != DEX_MAGIC or len(data) < 0x70:
+            raise ValueError("not a dex file")
+        self.data = data
+        (self.string_ids_size, self.string_ids_off,
+         self.type_ids_size, self.type_ids_off,
+         self.proto_ids_size, self.proto_ids_off,
+         self.field_ids_size, self.field_ids_off,
+         self.method_ids_size, self.method_ids_off,
+         self.class_defs_size, self.class_defs_off) = struct.unpack_from("<12I", data, 0x38)
+        self._strings = {}
+        self._protos = {}
+        self._methods = {}
+
+    def string_bytes(self, idx):
+        if idx not in self._strings:
+            (off,) = struct.unpack_from("<I", self.data, self.string_ids_off + 4 * idx)
+            _, start = read_uleb128(self.data, off)
+            end = self.data.index(b"\0", start)
+            self._strings[idx] = bytes(self.data[start:end])
+        return self._strings[idx]
+
+    def string(self, idx):
+        # MUTF-8 only differs from UTF-8 for NUL and surrogates, good enough for names
+        return self.string_bytes(idx).decode("utf-8", errors="replace")
+
+    def type_name(self, idx):
+        if idx == 0xFFFF or idx == NO_INDEX:
+            return None
+        (descriptor_idx,) = struct.unpack_from("<I", self.data, self.type_ids_off + 4 * idx)
+        return self.string(descriptor_idx)
+
+    def type_list(self, off):
+        if not off:
+            return []
+        (size,) = struct.unpack_from("<I", self.data, off)
+        return [self.type_name(t) for t in struct.unpack_from(f"<{size}H", self.data, off + 4)]
+
+    def proto(self, idx):
+        if idx not in self._protos:
+            _, return_idx, params_off = struct.unpack_from("<3I", self.data, self.proto_ids_off + 12 * idx)
+            self._protos[idx] = f"({''.join(self.type_list(params_off))}){self.type_name(return_idx)}"
+        return self._protos[idx]
+
+    def field(self, idx):
+        class_idx, type_idx, name_idx = struct.unpack_from("<HHI", self.data, self.field_ids_off + 8 * idx)
+        return f"{self.type_name(class_idx)}->{self.string(name_idx)}:{self.type_name(type_idx)}"
+
+    def method(self, idx):
+        if idx not in self._methods:
+            class_idx, proto_idx, name_idx = struct.unpack_from("<HHI", self.data, self.method_ids_off + 8 * idx)
+            self._methods[idx] = f"{self.type_name(class_idx)}->{self.string(name_idx)}{self.proto(proto_idx)}"
+        return self._methods[idx]
+
+    def resolve(self, kind, idx):
+        if kind == STRING:
+            return self.string_bytes(idx)
+        if kind == TYPE:
+            return self.type_name(idx).encode()
+        if kind == FIELD:
+            return self.field(idx).encode()
+        if kind == METHOD:
+            return self.method(idx).encode()
+        if kind == PROTO:
+            return self.proto(idx).encode()
+        # Call sites and method handles would need the map list, keep their raw index
+        return str(idx).encode()
+
+    def code_hash(self, code_off):
+        """SHA-256 of a code item with every table index replaced by the name it refers to."""
+        h = hashlib.sha256()
+        data = self.data
+        registers, ins, outs, tries_size, _, insns_size = struct.unpack_from("<4H2I", data, code_off)
+        h.update(struct.pack("<3H", registers, ins, outs))
+
+        insns_off = code_off + 16
+        units = struct.unpack_from(f"<{insns_size}H", data, insns_off)
+        pc = 0
+        while pc < insns_size:
+            unit = units[pc]
+            op = unit & 0xFF
+            if op == 0x00 and unit in (PACKED_SWITCH_PAYLOAD, SPARSE_SWITCH_PAYLOAD, FILL_ARRAY_DATA_PAYLOAD):
+                if unit == PACKED_SWITCH_PAYLOAD:
+                    size = units[pc + 1] * 2 + 4
+                elif unit == SPARSE_SWITCH_PAYLOAD:
+                    size = units[pc + 1] * 4 + 2
+                else:
+                    width = units[pc + 1]
+                    count = units[pc + 2] | (units[pc + 3] << 16)
+                    size = (count * width + 1) // 2 + 4
+                h.update(data[insns_off + 2 * pc:insns_off + 2 * min(pc + size, insns_size)])
+                pc += size
+                continue
+
+            size, kind, wide = OPCODES[op]
+            if kind is None:
+                h.update(data[insns_off + 2 * pc:insns_off + 2 * (pc + size)])
+            else:
+                idx = units[pc + 1] | (units[pc + 2] << 16) if wide else units[pc + 1]
+                h.update(struct.pack("<H", unit))
+                h.update(self.resolve(kind, idx))
+                h.update(b"\0")
+                if op in (0xFA, 0xFB):
+                    # Registers in unit 2, proto index in unit 3
+                    h.update(struct.pack("<H", units[pc + 2]))
+                    h.update(self.proto(units[pc + 3]).encode())
+                else:
+                    h.update(data[insns_off + 2 * (pc + (3 if wide else 2)):insns_off + 2 * (pc + size)])
+            pc += size
+
+        if tries_size:
+            tries_off = insns_off + 2 * insns_size
+            if insns_size % 2:
+                tries_off += 2
+            h.update(data[tries_off:tries_off + 8 * tries_size])
+            handlers_off = tries_off + 8 * tries_size
+            count, offset = read_uleb128(data, handlers_off)
+            for _ in range(count):
+                size, offset = read_sleb128(data, offset)
+                for _ in range(abs(size)):
+                    type_idx, offset = read_uleb128(data, offset)
+                    addr, offset = read_uleb128(data, offset)
+                    h.update(f"{self.type_name(type_idx)}@{addr};".encode())
+                if size <= 0:
+                    catch_all, offset = read_uleb128(data, offset)
+                    h.update(f"*@{catch_all};".encode())
+        return h.hexdigest()
+
+    def classes(self):
+        """Yields (class_name, definition_hash, {method_signature: code_hash})."""
+        data = self.data
+        for i in range(self.class_defs_size):
+            (class_idx, access_flags, superclass_idx, interfaces_off, _, _,
+             class_data_off, _) = struct.unpack_from("<8I", data, self.class_defs_off + 32 * i)
+            name = self.type_name(class_idx)
+            fields = []
+            methods = {}
+            if class_data_off:
+                offset = class_data_off
+                counts = []
+                for _ in range(4):
+                    value, offset = read_uleb128(data, offset)
+                    counts.append(value)
+                for n in counts[:2]:
+                    idx = 0
+                    for _ in range(n):
+                        diff, offset = read_uleb128(data, offset)
+                        flags, offset = read_uleb128(data, offset)
+                        idx += diff
+                        fields.append(f"{self.field(idx)}#{flags:x}")
+                for n in counts[2:]:
+                    idx = 0
+                    for _ in range(n):
+                        diff, offset = read_uleb128(data, offset)
+                        flags, offset = read_uleb128(data, offset)
+                        code_off, offset = read_uleb128(data, offset)
+                        idx += diff
+                        signature = self.method(idx).split("->", 1)[1]
+                        body = self.code_hash(code_off) if code_off else "abstract"
+                        methods[signature] = f"{flags:x}:{body}"
+
+            definition = json.dumps([access_flags, self.type_name(superclass_idx),
+                                     self.type_list(interfaces_off), sorted(fields)])
+            yield name, hashlib.sha256(definition.encode()).hexdigest(), methods
+
+
+def dex_entries(zf):
+    # classes.dex, classes2.dex, ... in the order the runtime loads them
+    names = [name for name in zf.namelist() if CLASSES_DEX_PATTERN.match(name)]
+    return sorted(names, key=lambda name: int(CLASSES_DEX_PATTERN.match(name).group(1) or 1))
+
+
+def load_classes(zf):
+    """All classes of an APK across its classesN.dex, first definition wins like in multidex."""
+    classes = {}
+    for name in dex_entries(zf):
+        for class_name, definition, methods in DexFile(zf.read(name)).classes():
+            classes.setdefault(class_name, (definition, methods))
+    return classes
+
+
+def diff_classes(old, new):
+    changed = {}
+    for name in sorted(set(old) & set(new)):
+        old_def, old_methods = old[name]
+        new_def, new_methods = new[name]
+        if old_def == new_def and old_methods == new_methods:
+            continue
+        changed[name] = {
+            "definition_changed": old_def != new_def,
+            "added_methods": sorted(set(new_methods) - set(old_methods)),
+            "removed_methods": sorted(set(old_methods) - set(new_methods)),
+            "changed_methods": sorted(m for m in set(old_methods) & set(new_methods) if old_methods[m] != new_methods[m]),
+        }
+    return {
+        "added_classes": sorted(set(new) - set(old)),
+        "removed_classes": sorted(set(old) - set(new)),
+        "changed_classes": changed,
+    }
+
+
+def diff_apk_dex(apk_path_1, apk_path_2):
+    """Class/method level diff of the dex code of two APKs, read straight from the zips."""
+    with zipfile.ZipFile(apk_path_1) as zf1, zipfile.ZipFile(apk_path_2) as zf2:
+        return diff_classes(load_classes(zf1), load_classes(zf2))
+
+
+def summarize(dex_diff):
+    changed = dex_diff["changed_classes"].values()
+    return {
+        "added_classes": len(dex_diff["added_classes"]),
+        "removed_classes": len(dex_diff["removed_classes"]),
+        "changed_classes": len(dex_diff["changed_classes"]),
+        "added_methods": sum(len(c["added_methods"]) for c in changed),
+        "removed_methods": sum(len(c["removed_methods"]) for c in changed),
+        "changed_methods": sum(len(c["changed_methods"]) for c in changed),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: dex_diff.py <old.apk> <new.apk>")
+        sys.exit(1)
+
+    result = diff_apk_dex(sys.argv[1], sys.argv[2])
+    result["summary"] = summarize(result)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+import json
+import mmap
+import struct
+import sys
+from collections import namedtuple
+
+ELF_MAGIC = b"\x7fELF"
+
+ET_REL, ET_EXEC, ET_DYN = 1, 2, 3
+
+PT_LOAD, PT_DYNAMIC, PT_INTERP = 1, 2, 3
+PT_GNU_STACK, PT_GNU_RELRO = 0x6474E551, 0x6474E552
+PF_X, PF_W, PF_R = 1, 2, 4
+
+SHT_SYMTAB, SHT_STRTAB, SHT_DYNAMIC, SHT_NOBITS, SHT_DYNSYM = 2, 3, 6, 8, 11
+SHF_ALLOC, SHF_EXECINSTR = 0x2, 0x4
+
+DT_NULL, DT_NEEDED, DT_HASH, DT_STRTAB, DT_SYMTAB, DT_STRSZ, DT_SYMENT = 0, 1, 4, 5, 6, 10, 11
+DT_SONAME, DT_RPATH, DT_DEBUG, DT_BIND_NOW, DT_FLAGS, DT_RUNPATH = 14, 15, 21, 24, 30, 29
+DT_GNU_HASH, DT_FLAGS_1 = 0x6FFFFEF5, 0x6FFFFFFB
+DF_BIND_NOW = 0x8
+DF_1_PIE = 0x08000000
+
+STT_FUNC = 2
+
+MACHINES = {3: "x86", 8: "mips", 40: "arm", 62: "x86_64", 183: "aarch64", 243: "riscv"}
+
+# Functions glibc ships a _chk variant for, as checksec collects them from the host libc
+FORTIFIABLE_FUNCTIONS = frozenset((
+    "asprintf", "confstr", "dprintf", "explicit_bzero", "fdelt", "fgets", "fgets_unlocked",
+    "fgetws", "fgetws_unlocked", "fprintf", "fread", "fread_unlocked", "fwprintf", "getcwd",
+    "getdomainname", "getgroups", "gethostname", "getlogin_r", "gets", "getwd", "longjmp",
+    "mbsnrtowcs", "mbsrtowcs", "mbstowcs", "memcpy", "memmove", "mempcpy", "memset",
+    "obstack_printf", "obstack_vprintf", "poll", "ppoll", "pread64", "pread", "printf",
+    "ptsname_r", "read", "readlink", "readlinkat", "realpath", "recv", "recvfrom", "snprintf",
+    "sprintf", "stpcpy", "stpncpy", "strcat", "strcpy", "strncat", "strncpy", "swprintf",
+    "syslog", "ttyname_r", "vasprintf", "vdprintf", "vfprintf", "vfwprintf", "vprintf",
+    "vsnprintf", "vsprintf", "vswprintf", "vsyslog", "vwprintf", "wcpcpy", "wcpncpy",
+    "wcrtomb", "wcscat", "wcscpy", "wcsncat", "wcsncpy", "wcsnrtombs", "wcsrtombs",
+    "wcstombs", "wctomb", "wmemcpy", "wmemmove", "wmempcpy", "wmemset", "wprintf",
+))
+CANARY_SYMBOLS = ("__stack_chk_fail", "__stack_chk_guard", "__intel_security_cookie")
+
+ProgramHeader = namedtuple("ProgramHeader", ["p_type", "p_flags", "p_offset", "p_vaddr", "p_filesz", "p_memsz"])
+Section = namedtuple("Section", ["name", "sh_type", "sh_flags", "sh_addr", "sh_offset", "sh_size", "sh_link", "sh_entsize"])
+Symbol = namedtuple("Symbol", ["name", "value", "size", "type", "bind", "shndx"])
+
+
+class ElfFile:
+    """
+    Read-only view of an ELF file through mmap. Only parses what the checks need:
+    headers, program headers, sections, the dynamic section and symbol tables.
+    Raises ValueError for anything that is not a well-formed ELF.
+    """
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path}: empty file")
+        self._base = offset
+        self.data = memoryview(self._map)[offset:]
+        try:
+            self._parse_header()
+        except (struct.error, IndexError):
+            self.close()
+            raise ValueError(f"{path}: truncated ELF header")
+        self._sections = None
+        self._dynamic = None
+
+    def close(self):
+        if self._map is not None:
+            self.data.release()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _parse_header(self):
+        if bytes(self.data[:4]) != ELF_MAGIC:
+            self.close()
+            raise ValueError(f"{self.path}: not an ELF file")
+        ei_class, ei_data = self.data[4], self.data[5]
+        if ei_class not in (1, 2) or ei_data not in (1, 2):
+            self.close()
+            raise ValueError(f"{self.path}: unsupported ELF class/encoding")
+        self.is64 = ei_class == 2
+        self.endian = "<" if ei_data == 1 else ">"
+        if self.is64:
+            fields = struct.unpack_from(self.endian + "HHIQQQIHHHHHH", self.data, 16)
+        else:
+            fields = struct.unpack_from(self.endian + "HHIIIIIHHHHHH", self.data, 16)
+        (self.e_type, self.e_machine, _, self.e_entry, self.e_phoff, self.e_shoff, _,
+         _, self.e_phentsize, self.e_phnum, self.e_shentsize, self.e_shnum, self.e_shstrndx) = fields
+        self.machine = MACHINES.get(self.e_machine, str(self.e_machine))
+
+        self.program_headers = []
+        for i in range(self.e_phnum):
+            off = self.e_phoff + i * self.e_phentsize
+            if self.is64:
+                p_type, p_flags, p_offset, p_vaddr, _, p_filesz, p_memsz, _ = struct.unpack_from(self.endian + "IIQQQQQQ", self.data, off)
+            else:
+                p_type, p_offset, p_vaddr, _, p_filesz, p_memsz, p_flags, _ = struct.unpack_from(self.endian + "IIIIIIII", self.data, off)
+            self.program_headers.append(ProgramHeader(p_type, p_flags, p_offset, p_vaddr, p_filesz, p_memsz))
+
+    def _cstring(self, offset):
+        start = self._base + offset
+        end = self._map.find(b"\x00", start)
+        if end == -1:
+            end = len(self._map)
+        return self._map[start:end].decode("utf-8", errors="replace")
+
+    @property
+    def sections(self):
+        if self._sections is None:
+            self._sections = self._parse_sections()
+        return self._sections
+
+    def _parse_sections(self):
+        if not self.e_shoff or not self.e_shnum:
+            return []
+        raw = []
+        for i in range(self.e_shnum):
+            off = self.e_shoff + i * self.e_shentsize
+            try:
+                if self.is64:
+                    fields = struct.unpack_from(self.endian + "IIQQQQIIQQ", self.data, off)
+                else:
+                    fields = struct.unpack_from(self.endian + "IIIIIIIIII", self.data, off)
+            except struct.error:
+                return []
+            raw.append(fields)
+
+        names_off = raw[self.e_shstrndx][4] if self.e_shstrndx < len(raw) else None
+        sections = []
+        for sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, _, _, sh_entsize in raw:
+            name = self._cstring(names_off + sh_name) if names_off is not None else ""
+            sections.append(Section(name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, sh_entsize))
+        return sections
+
+    def section(self, name):
+        for sec in self.sections:
+            if sec.name == name:
+                return sec
+        return None
+
+    def section_data(self, sec):
+        if sec.sh_type == SHT_NOBITS:
+            return b""
+        return self.data[sec.sh_offset:sec.sh_offset + sec.sh_size]
+
+    def segments(self, p_type):
+        return [ph for ph in self.program_headers if ph.p_type == p_type]
+
+    def vaddr_to_offset(self, vaddr):
+        for ph in self.segments(PT_LOAD):
+            if ph.p_vaddr <= vaddr < ph.p_vaddr + ph.p_filesz:
+                return ph.p_offset + (vaddr - ph.p_vaddr)
+        return None
+
+    @property
+    def dynamic(self):
+        """List of (tag, value) pairs from PT_DYNAMIC, without the DT_NULL terminator."""
+        if self._dynamic is None:
+            self._dynamic = self._parse_dynamic()
+        return self._dynamic
+
+    def _parse_dynamic(self):
+        segs = self.segments(PT_DYNAMIC)
+        if not segs:
+            return []
+        seg = segs[0]
+        fmt = self.endian + ("qQ" if self.is64 else "iI")
+        entsize = struct.calcsize(fmt)
+        entries = []
+        end = min(seg.p_offset + seg.p_filesz, len(self.data))
+        for off in range(seg.p_offset, end - entsize + 1, entsize):
+            tag, val = struct.unpack_from(fmt, self.data, off)
+            if tag == DT_NULL:
+                break
+            entries.append((tag & 0xFFFFFFFFFFFFFFFF, val))
+        return entries
+
+    def dynamic_values(self, tag):
+        return [val for t, val in self.dynamic if t == tag]
+
+    def _dynstr_offset(self):
+        dynstr = self.section(".dynstr")
+        if dynstr is not None:
+            return dynstr.sh_offset
+        strtab = self.dynamic_values(DT_STRTAB)
+        return self.vaddr_to_offset(strtab[0]) if strtab else None
+
+    def dynamic_strings(self, tag):
+        base = self._dynstr_offset()
+        if base is None:
+            return []
+        return [self._cstring(base + val) for val in self.dynamic_values(tag)]
+
+    @property
+    def needed(self):
+        return self.dynamic_strings(DT_NEEDED)
+
+    @property
+    def soname(self):
+        names = self.dynamic_strings(DT_SONAME)
+        return names[0] if names else None
+
+    @property
+    def interpreter(self):
+        segs = self.segments(PT_INTERP)
+        if not segs:
+            return None
+        return self._cstring(segs[0].p_offset)
+
+    def _read_symbols(self, offset, count, strtab_offset):
+        fmt = self.endian + ("IBBHQQ" if self.is64 else "IIIBBH")
+        entsize = struct.calcsize(fmt)
+        symbols = []
+        for i in range(count):
+            try:
+                fields = struct.unpack_from(fmt, self.data, offset + i * entsize)
+            except struct.error:
+                break
+            if self.is64:
+                st_name, st_info, _, st_shndx, st_value, st_size = fields
+            else:
+                st_name, st_value, st_size, st_info, _, st_shndx = fields
+            name = self._cstring(strtab_offset + st_name) if st_name else ""
+            symbols.append(Symbol(name, st_value, st_size, st_info & 0xF, st_info >> 4, st_shndx))
+        return symbols
+
+    def symbols(self, sh_type):
+        for sec in self.sections:
+            if sec.sh_type == sh_type and sec.sh_entsize:
+                strtab = self.sections[sec.sh_link] if sec.sh_link < len(self.sections) else None
+                if strtab is None:
+                    return []
+                return self._read_symbols(sec.sh_offset, sec.sh_size // sec.sh_entsize, strtab.sh_offset)
+        if sh_type == SHT_DYNSYM:
+            return self._dynamic_symbols_without_sections()
+        return []
+
+    def _dynamic_symbols_without_sections(self):
+        # Stripped section headers: size the table through DT_HASH/DT_GNU_HASH
+        symtab = self.dynamic_values(DT_SYMTAB)
+        strtab = self._dynstr_offset()
+        if not symtab or strtab is None:
+            return []
+        sym_off = self.vaddr_to_offset(symtab[0])
+        count = self._symbol_count_from_hash()
+        if sym_off is None or count is None:
+            return []
+        return self._read_symbols(sym_off, count, strtab)
+
+    def _symbol_count_from_hash(self):
+        word = self.endian + "I"
+        hashes = self.dynamic_values(DT_HASH)
+        if hashes:
+            off = self.vaddr_to_offset(hashes[0])
+            if off is not None:
+                return struct.unpack_from(word, self.data, off + 4)[0]
+
+        gnu = self.dynamic_values(DT_GNU_HASH)
+        if not gnu:
+            return None
+        off = self.vaddr_to_offset(gnu[0])
+        if off is None:
+            return None
+        nbuckets, symoffset, bloom_size, _ = struct.unpack_from(self.endian + "IIII", self.data, off)
+        buckets_off = off + 16 + bloom_size * (8 if self.is64 else 4)
+        buckets = struct.unpack_from(self.endian + f"{nbuckets}I", self.data, buckets_off)
+        last = max(buckets) if buckets else 0
+        if last < symoffset:
+            return symoffset
+        chain_off = buckets_off + nbuckets * 4
+        while True:
+            value = struct.unpack_from(word, self.data, chain_off + (last - symoffset) * 4)[0]
+            last += 1
+            if value & 1:
+                return last
+
+    @property
+    def is_executable(self):
+        # ET_EXEC, or a PIE: marked with DF_1_PIE, or (older linkers) with an interpreter and
+        # no DT_SONAME. An interpreter alone is not enough, libc.so and friends carry one too
+        if self.e_type == ET_EXEC:
+            return True
+        if self.e_type != ET_DYN:
+            return False
+        if any(val & DF_1_PIE for val in self.dynamic_values(DT_FLAGS_1)):
+            return True
+        return bool(self.segments(PT_INTERP)) and not self.dynamic_values(DT_SONAME)
+
+
+def hardening_properties(path, offset=0):
+    """
+    checksec --format=json equivalent, computed from the ELF structures directly.
+    Keys and value spellings match checksec so digests stay comparable.
+    """
+    with ElfFile(path, offset) as elf:
+        tags = {tag for tag, _ in elf.dynamic}
+
+        if elf.segments(PT_GNU_RELRO):
+            bind_now = DT_BIND_NOW in tags or any(v & DF_BIND_NOW for v in elf.dynamic_values(DT_FLAGS))
+            relro = "full" if bind_now or elf.section(".got.plt") is None else "partial"
+        else:
+            relro = "no"
+
+        stack = elf.segments(PT_GNU_STACK)
+        nx = "yes" if stack and (stack[0].p_flags & (PF_R | PF_W | PF_X)) != (PF_R | PF_W | PF_X) else "no"
+
+        if elf.e_type == ET_EXEC:
+            pie = "no"
+        elif elf.e_type == ET_DYN:
+            pie = "yes" if DT_DEBUG in tags else "dso"
+        elif elf.e_type == ET_REL:
+            pie = "rel"
+        else:
+            pie = "no"
+
+        dynsyms = elf.symbols(SHT_DYNSYM)
+        symtab = elf.section(".symtab")
+        all_names = {sym.name for sym in dynsyms}
+        if symtab is not None:
+            all_names.update(sym.name for sym in elf.symbols(SHT_SYMTAB))
+        canary = "yes" if any(name in all_names for name in CANARY_SYMBOLS) else "no"
+
+        fortified = 0
+        fortifiable = 0
+        for sym in dynsyms:
+            name = sym.name.lstrip("_")
+            if name in FORTIFIABLE_FUNCTIONS:
+                fortifiable += 1
+            elif name.endswith("_chk") and name[:-4] in FORTIFIABLE_FUNCTIONS:
+                fortified += 1
+                fortifiable += 1
+        if fortified == 0:
+            fortify_source = "no"
+        elif fortified == fortifiable:
+            fortify_source = "yes"
+        else:
+            fortify_source = "partial"
+
+        return {
+            "relro": relro,
+            "canary": canary,
+            "nx": nx,
+            "pie": pie,
+            "rpath": "yes" if DT_RPATH in tags else "no",
+            "runpath": "yes" if DT_RUNPATH in tags else "no",
+            "symbols": "yes" if symtab is not None else "no",
+            "fortify_source": fortify_source,
+            "fortified": str(fortified),
+            "fortify-able": str(fortifiable),
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: elf_reader.py <elf> [<elf> ...]")
+        sys.exit(1)
+
+    print(json.dumps({path: hardening_properties(path) for path in sys.argv[1:]}, indent=2))
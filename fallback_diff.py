@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import sys
+
+import elf_reader
+
+# Tiers, cheapest and coarsest first. The result is labelled with the finest one the
+# binaries allow: stripped Android binaries usually stop at "dynsym"
+TIER_RADIFF2 = "radiff2"
+# Not a fallback: pairs proven identical before radiff2 ever runs
+TIER_FAST_PATH = "fast-path"
+TIER_SECTIONS = "section-hashes"
+TIER_DYNSYM = "dynsym"
+TIER_SYMBOLS = "symbol-hashes"
+
+# Sections that change between builds of the same code: build ids and other notes,
+# the minidebuginfo Android embeds, debug info and toolchain comments
+VOLATILE_SECTION_PREFIXES = (".note", ".gnu_debugdata", ".gnu_debuglink", ".comment", ".debug", ".zdebug")
+
+# Functions listed by name in the fallback details, per kind of change
+MAX_LISTED_SYMBOLS = 50
+
+
+def is_volatile_section(name):
+    return name.startswith(VOLATILE_SECTION_PREFIXES)
+
+
+def section_hashes(elf, volatile=False):
+    """
+    {name: (size, address, sha256)} of every section that is loaded at runtime, minus
+    the volatile ones. With volatile=True, of the volatile sections only, loaded or not.
+    """
+    hashes = {}
+    for sec in elf.sections:
+        if not sec.name or is_volatile_section(sec.name) != volatile:
+            continue
+        if not volatile and not sec.sh_flags & elf_reader.SHF_ALLOC:
+            continue
+        hashes[sec.name] = (sec.sh_size, sec.sh_addr, hashlib.sha256(elf.section_data(sec)).hexdigest())
+    return hashes
+
+
+def compare_sections(old, new):
+    identical = [name for name in old if name in new and old[name] == new[name]]
+    changed = [name for name in old if name in new and old[name] != new[name]]
+    # Share of loaded bytes sitting in identical sections, a coarse stand-in for radiff2 -s
+    total = sum(entry[0] for entry in old.values()) + sum(entry[0] for entry in new.values())
+    same = 2 * sum(old[name][0] for name in identical)
+    return {
+        "identical": len(identical),
+        "changed": sorted(changed),
+        "added": sorted(set(new) - set(old)),
+        "removed": sorted(set(old) - set(new)),
+        "similarity": same / total if total else 1.0,
+    }
+
+
+def function_hashes(elf, sh_type):
+    """
+    {name: sha256 of the code bytes} of the defined, sized functions in a symbol table.
+    Code is hashed as is: a function whose call targets moved counts as changed.
+    """
+    hashes = {}
+    for sym in elf.symbols(sh_type):
+        if sym.type != elf_reader.STT_FUNC or not sym.name or not sym.size or sym.shndx == 0:
+            continue
+        # ARM Thumb functions have the low bit set in their address
+        value = sym.value & ~1 if elf.machine == "arm" else sym.value
+        offset = elf.vaddr_to_offset(value)
+        if offset is None:
+            continue
+        hashes[sym.name] = hashlib.sha256(elf.data[offset:offset + sym.size]).hexdigest()
+    return hashes
+
+
+def compare_functions(old, new):
+    matched = [name for name in new if name in old]
+    changed = sorted(name for name in matched if old[name] != new[name])
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    # Same keys as summarize_radiff's function summary; functions only in the old binary
+    # are what radiff2 reports as unmatched
+    summary = {
+        "total_functions": len(set(old) | set(new)),
+        "identical": len(matched) - len(changed),
+        "changed": len(changed) + len(removed),
+        "changed matched": len(changed),
+        "changed unmatched": len(removed),
+        "new": len(added),
+    }
+    details = {
+        "changed": changed[:MAX_LISTED_SYMBOLS],
+        "added": added[:MAX_LISTED_SYMBOLS],
+        "removed": removed[:MAX_LISTED_SYMBOLS],
+    }
+    return summary, details
+
+
+def unknown_function_summary():
+    return {
+        "total_functions": -1,
+        "identical": -1,
+        "changed": -1,
+        "changed matched": -1,
+        "changed unmatched": -1,
+        "new": -1,
+    }
+
+
+def identical_code(file1, file2):
+    """
+    Fast path before radiff2. When every non-volatile loaded section is the same bytes at
+    the same address and so are the exported functions, returns the function summary of
+    an all-identical pair (tier TIER_FAST_PATH), else None.
+    """
+    with elf_reader.ElfFile(file1) as old, elf_reader.ElfFile(file2) as new:
+        if (old.e_machine, old.is64, old.e_entry) != (new.e_machine, new.is64, new.e_entry):
+            return None
+        # Without section headers nothing can be proven
+        old_sections = section_hashes(old)
+        if not old_sections or old_sections != section_hashes(new):
+            return None
+        exported = function_hashes(new, elf_reader.SHT_DYNSYM)
+        if function_hashes(old, elf_reader.SHT_DYNSYM) != exported:
+            return None
+
+        functions = len(function_hashes(new, elf_reader.SHT_SYMTAB) or exported)
+        old_volatile = section_hashes(old, volatile=True)
+        new_volatile = section_hashes(new, volatile=True)
+
+    summary = {
+        "total_functions": functions,
+        "identical": functions,
+        "changed": 0,
+        "changed matched": 0,
+        "changed unmatched": 0,
+        "new": 0,
+        "tier": TIER_FAST_PATH,
+        "details": {"sections": {
+            "identical": len(old_sections),
+            "changed": [],
+            "added": [],
+            "removed": [],
+            "ignored": sorted(name for name in set(old_volatile) | set(new_volatile)
+                              if old_volatile.get(name) != new_volatile.get(name)),
+        }},
+    }
+    return summary
+
+
+def fallback_analysis(file1, file2):
+    """
+    In-process replacement for the radiff2 analysis of an ELF pair, in seconds instead of hours.
+    Returns (similarity, function_summary) shaped like radiff_session.analyze_pair's; the
+    summary carries the tier it came from under "tier" and what each tier found under "details".
+    Function counts stay -1 when neither symbol table has sized functions.
+    """
+    with elf_reader.ElfFile(file1) as old, elf_reader.ElfFile(file2) as new:
+        sections = compare_sections(section_hashes(old), section_hashes(new))
+        details = {"sections": {k: v for k, v in sections.items() if k != "similarity"}}
+        summary = unknown_function_summary()
+        tier = TIER_SECTIONS
+
+        old_funcs = function_hashes(old, elf_reader.SHT_DYNSYM)
+        new_funcs = function_hashes(new, elf_reader.SHT_DYNSYM)
+        if old_funcs or new_funcs:
+            summary, details["dynsym"] = compare_functions(old_funcs, new_funcs)
+            tier = TIER_DYNSYM
+
+        # Unstripped binaries: every function, not only the exported ones
+        old_funcs = function_hashes(old, elf_reader.SHT_SYMTAB)
+        new_funcs = function_hashes(new, elf_reader.SHT_SYMTAB)
+        if old_funcs and new_funcs:
+            summary, details["symbols"] = compare_functions(old_funcs, new_funcs)
+            tier = TIER_SYMBOLS
+
+    summary["tier"] = tier
+    summary["details"] = details
+    return sections["similarity"], summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: fallback_diff.py <old.so> <new.so>")
+        sys.exit(1)
+
+    summary = identical_code(sys.argv[1], sys.argv[2])
+    if summary is not None:
+        print("Identical code, only volatile sections differ")
+        print(json.dumps(summary, indent=2))
+        sys.exit(0)
+
+    similarity, summary = fallback_analysis(sys.argv[1], sys.argv[2])
+    print(f"Tier: {summary['tier']}, estimated similarity: {similarity:.3f}")
+    print(json.dumps(summary, indent=2))
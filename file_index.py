@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import elf_reader
+
+HEAD_SIZE = 4096
+SEPOLICY_MAGIC = b"\x8c\xff\x7c\xf9"
+AXML_MAGIC = b"\x03\x00\x08\x00"
+ZIP_MAGIC = b"PK\x03\x04"
+PEM_MARKER = b"-----BEGIN CERTIFICATE-----"
+# Android cacerts carry an `openssl x509 -text` dump before the PEM block
+PEM_SCAN_LIMIT = 64 * 1024
+
+# Indexes registered with use_index(), consulted before probing a file
+LOADED_INDEXES = []
+
+
+def classify_elf(path, offset=0):
+    try:
+        with elf_reader.ElfFile(path, offset) as elf:
+            if elf.is_executable:
+                kind = "elf_exec"
+            elif elf.e_type == elf_reader.ET_DYN:
+                kind = "elf_dyn"
+            else:
+                kind = "elf_other"
+            return {"type": kind, "arch": elf.machine, "bits": 64 if elf.is64 else 32}
+    except (OSError, ValueError):
+        return {"type": "elf_other"}
+
+
+def classify_zip(path):
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return {"type": "other"}
+    # APEXes carry an AndroidManifest.xml too, but aren't analysed as APKs
+    if "apex_manifest.pb" in names or "apex_payload.img" in names:
+        return {"type": "apex"}
+    if "AndroidManifest.xml" in names and path.endswith(".apk"):
+        return {"type": "apk"}
+    if path.endswith(".jar") or "META-INF/MANIFEST.MF" in names:
+        return {"type": "jar"}
+    return {"type": "zip"}
+
+
+def classify(path):
+    """
+    Works out what a file is from its magic bytes (and ELF header), without file(1).
+    Returns a record like {"type": "elf_exec", "arch": "aarch64", "bits": 64}.
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(HEAD_SIZE)
+            if PEM_MARKER not in head and size <= PEM_SCAN_LIMIT and b"\0" not in head:
+                head += f.read()
+    except OSError:
+        return {"type": "unreadable"}
+
+    if head.startswith(elf_reader.ELF_MAGIC):
+        return classify_elf(path)
+    if head[:4] in (b"SEC2", b"SEC3") and elf_reader.ELF_MAGIC in head[:16]:
+        record = classify_elf(path, head.find(elf_reader.ELF_MAGIC))
+        record.update({"type": "tee_ta", "format": head[:4].decode()})
+        return record
+    if head.startswith(SEPOLICY_MAGIC):
+        return {"type": "sepolicy"}
+    if head.startswith(ZIP_MAGIC):
+        return classify_zip(path)
+    if head.startswith(AXML_MAGIC):
+        return {"type": "axml"}
+    # DER certificate: SEQUENCE { SEQUENCE (tbsCertificate) ... }, both with long-form lengths
+    if head[:2] == b"\x30\x82" and head[4:6] == b"\x30\x82":
+        return {"type": "cert_der"}
+    if PEM_MARKER in head:
+        return {"type": "cert_pem"}
+    return {"type": "other"}
+
+
+def walk_files(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield path
+
+
+def build_index(root, workers=None):
+    root = os.path.abspath(root)
+    paths = list(walk_files(root))
+    # Mostly small reads, threads keep plenty of them in flight
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        records = executor.map(classify, paths, chunksize=64)
+        files = {os.path.relpath(path, root): record for path, record in zip(paths, records)}
+    return {"root": root, "files": files}
+
+
+def load_index(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def use_index(index):
+    LOADED_INDEXES.append(index)
+
+
+def indexed_type(path):
+    """Type recorded for path by a loaded index, None when no loaded index has it."""
+    path = os.path.abspath(path)
+    for index in LOADED_INDEXES:
+        rel = os.path.relpath(path, index["root"])
+        if rel.startswith(".."):
+            continue
+        record = index["files"].get(rel)
+        if record:
+            return record["type"]
+    return None
+
+
+def file_type(path):
+    return indexed_type(path) or classify(path)["type"]
+
+
+def is_executable_elf(path):
+    return file_type(path) == "elf_exec"
+
+
+def is_sepolicy_file(path):
+    return file_type(path) == "sepolicy"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Classify every file of an extracted firmware tree by its magic bytes")
+    parser.add_argument("root", help="Extracted userspace partitions")
+    parser.add_argument("output", help="Index JSON to write")
+    parser.add_argument("--workers", type=int, default=None, help="Reader threads")
+    args = parser.parse_args()
+
+    index = build_index(args.root, args.workers)
+    with open(args.output, "w") as f:
+        json.dump(index, f)
+
+    counts = {}
+    for record in index["files"].values():
+        counts[record["type"]] = counts.get(record["type"], 0) + 1
+    print(f"Indexed {len(index['files'])} files under {index['root']}: " +
+          ", ".join(f"{kind}={count}" for kind, count in sorted(counts.items())), file=sys.stderr)
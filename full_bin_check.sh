@@ -16,10 +16,14 @@ echo "Unpacking apex...."
 ./unpack_apexes.sh $fw2
 
 echo "Diffing, getting the stat..."
-git diff --no-index --numstat $fw1 $fw2 > "check_2_bins_libs/${diffname}"
+python3 tree_diff.py $fw1 $fw2 > "check_2_bins_libs/${diffname}"
+
+echo "Indexing file types..."
+python3 file_index.py $fw1 check_2_bins_libs/intermediate_files/file_index_1.json
+python3 file_index.py $fw2 check_2_bins_libs/intermediate_files/file_index_2.json
 
 echo "Getting libs and bins..."
 check_2_bins_libs/generate_rc_bins_libs.sh $fw2 check_2_bins_libs/intermediate_files/rc_bins.txt check_2_bins_libs/intermediate_files/rc_bins.json check_2_bins_libs/intermediate_files/rc_libs.json 
 
 echo "Calling json dumper..."
-python3 json_dumper.py "check_2_bins_libs/${diffname}" "check_2_bins_libs/${diffname}.json" check_2_bins_libs/intermediate_files/rc_bins.json check_2_bins_libs/intermediate_files/rc_libs.json  check_2_bins_libs/intermediate_files/unsorted_bin_digest.json check_2_bins_libs/intermediate_files/unsorted_apk_digest.json check_2_bins_libs/sepolicy_digest.json
\ No newline at end of file
+python3 json_dumper.py "check_2_bins_libs/${diffname}" "check_2_bins_libs/${diffname}.json" check_2_bins_libs/intermediate_files/rc_bins.json check_2_bins_libs/intermediate_files/rc_libs.json  check_2_bins_libs/intermediate_files/unsorted_bin_digest.json check_2_bins_libs/intermediate_files/unsorted_apk_digest.json check_2_bins_libs/sepolicy_digest.json --file-index check_2_bins_libs/intermediate_files/file_index_1.json --file-index check_2_bins_libs/intermediate_files/file_index_2.json
\ No newline at end of file
@@ -5,18 +5,34 @@ import re
 import cert_equivalence
 import subprocess
 import tempfile
-import shutil
 import summarize_radiff as radigest
+import radiff_session
+import tool_runner
+import tree_diff
+import file_index
+import zip_diff
+import dex_diff
+import fallback_diff
+import struct
+import zipfile
+import zlib
+from result_cache import ResultCache, DEFAULT_CACHE_DIR, format_stats_delta
 import argparse
 from os.path import basename
 import os
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
+from result_journal import ResultJournal, write_digests
+from task_metrics import MetricsLog, Progress
+from task_scheduler import TaskScheduler, CostModel, plan_shards, DEFAULT_HISTORY_PATH, default_worker_count, default_memory_budget
 from collections import namedtuple
+import itertools
 import time
 import traceback
 
-Task = namedtuple("Task", ["task_type", "args", "output_key"])
+# time_budget: seconds radiff2 may spend on a bin/tee pair (None: no budget), 0 skips
+# radiff2 for the fallback tiers because the pair is predicted to overrun
+Task = namedtuple("Task", ["task_type", "args", "output_key", "time_budget"], defaults=(None,))
 
 TIER_3_IGNORED_PREFIXES = (
     "META-INF/", "SEC-INF/", "META-INF/CERT.RSA", "META-INF/CERT.SF", "META-INF/MANIFEST.MF"
@@ -32,12 +48,58 @@ TIER_2_MEANINGFUL = ( "assets/", "res/", "resources.arsc", "kotlin/", "smali/")
 APK_PREFIX_PATTERN = re.compile(r"apk[12]_[^/]+/")
 #APK_PREFIX_PATTERN = re.compile(r"^(tmp/)?apk[12]_[^/]+/")
 
+# Set in the parent before the pool forks, so every worker shares the same store
+RESULT_CACHE = None
+# Stage a task's metrics show when its pair came from the result cache
+CACHE_HIT_STAGE = "result cache hit"
+
+# Results of TEE probes for TAs that could not be parsed, also shown in the hierarchy
+OBFUSCATED_TEE = {"TEE": True, "Obfuscated": True}
+OBFUSCATED_TEE_ANALYSIS = "TEE: true;\nObfuscated: true"
+# Digest a probe's failure is reported in
+PROBE_CATEGORIES = {"tee": "bin", "se": "se", "elf": "bin"}
+
+def run_probe(task):
+    """Cheap classification of a changed file, returns the analysis task it needs (or None)."""
+    kind, args = task.args
+    if kind == "tee":
+        path, ta1_path, ta2_path, rc_bin_paths = args
+        if is_tee_trusted_app(ta2_path):
+            return ("task", task.output_key, Task("tee", args, task.output_key))
+        if looks_encrypted(ta2_path):
+            return ("bin", task.output_key, OBFUSCATED_TEE)
+    elif kind == "se":
+        sepath_1, sepath_2 = args
+        if is_sepolicy_file(sepath_2):
+            return ("task", task.output_key, Task("se", args, task.output_key))
+    elif kind == "elf":
+        if radigest.is_executable_elf(args[2]):
+            return ("task", task.output_key, Task("bin", args, task.output_key))
+    return None
+
+def diff_certs(path, cert1, cert2):
+    with tool_runner.stage("cert"):
+        if not cert_equivalence.main(cert1, cert2):
+            return ""
+    with tool_runner.stage("git diff"):
+        result = subprocess.run(
+            ["git", "diff", "--no-index", cert1, cert2],
+            capture_output=True,
+            text=True,
+        )
+    return result.stdout
+
 def execute_task(task):
-    print(f"[{time.strftime('%H:%M:%S')}] [PID {os.getpid()}] Running {task.task_type.upper()} task: {task.output_key}", flush=True)
+    if task.task_type != "probe":
+        print(f"[{time.strftime('%H:%M:%S')}] [PID {os.getpid()}] Running {task.task_type.upper()} task: {task.output_key}", flush=True)
+    category = PROBE_CATEGORIES[task.args[0]] if task.task_type == "probe" else task.task_type
 
     try:
-        if task.task_type == "bin":
-            digest, summary = analyze_shared_lib_or_bin(*task.args)
+        if task.task_type == "probe":
+            return run_probe(task)
+
+        elif task.task_type == "bin":
+            digest, summary = analyze_shared_lib_or_bin(*task.args, time_budget=task.time_budget)
             return ("bin", task.output_key, digest)
 
         elif task.task_type == "apk":
@@ -45,25 +107,123 @@ def execute_task(task):
             return ("apk", task.output_key, apk_digest)
 
         elif task.task_type == "tee":
-            digest, summary = analyze_tee_trusted_app(*task.args)
+            digest, summary = analyze_tee_trusted_app(*task.args, time_budget=task.time_budget)
             return ("bin", task.output_key, digest)
 
         elif task.task_type == "se":
             se_diff = analyze_sepolicies(*task.args)
             return ("se", task.output_key, se_diff)
 
+        elif task.task_type == "cert":
+            return ("cert", task.output_key, diff_certs(*task.args))
+
         else:
             print(f"[ERROR] Unknown task type: {task.task_type}", flush=True)
             return None
 
+    except tool_runner.MemoryLimitExceeded as e:
+        print(f"[OOM] Task {task.task_type.upper()} ({task.output_key}): {e}", flush=True)
+        return (category, task.output_key, {"oom": True, "memory_limit": e.limit, "peak_rss": e.peak_rss})
+
     except subprocess.TimeoutExpired:
         print(f"[TIMEOUT] Task {task.task_type.upper()} ({task.output_key}) timed out", flush=True)
         # Return a stub object depending on type
-        return (task.task_type, task.output_key, {"timeout": True})
+        return (category, task.output_key, {"timeout": True})
 
     except Exception as e:
         print(f"[CRASH] Task {task.task_type.upper()} ({task.output_key}) failed with exception:\n{traceback.format_exc()}", flush=True)
-        return (task.task_type, task.output_key, {"error": str(e)})
+        return (category, task.output_key, {"error": str(e)})
+
+def failed_task_result(task, error):
+    """What execute_task would have returned for a task whose worker died (or raised past it)."""
+    category = PROBE_CATEGORIES[task.args[0]] if task.task_type == "probe" else task.task_type
+    print(f"[CRASH] Task {task.task_type.upper()} ({task.output_key}) lost its worker: {error!r}", flush=True)
+    return (category, task.output_key, {"error": f"worker failed: {error!r}"})
+
+def is_complete_pair_result(checksec_props, distance, summary):
+    # Timeouts and tool failures must be retried on the next run, never cached
+    return (
+        "error" not in checksec_props
+        and distance != -1
+        and summary.get("total_functions", -1) != -1
+        and "error" not in summary
+    )
+
+def with_fallback(file1, file2, similarity, distance, summary):
+    """Fills in what radiff2 could not deliver (timeout, failure, skipped) from fallback_diff's tiers."""
+    try:
+        with tool_runner.stage("fallback"):
+            estimate, fallback = fallback_diff.fallback_analysis(file1, file2)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"{file2}: fallback analysis failed: {e}", flush=True)
+        return similarity, summary
+    print(f"{file2}: radiff2 result incomplete, using fallback tier {fallback['tier']}", flush=True)
+    if distance == -1:
+        similarity = estimate
+    if summary.get("total_functions", -1) == -1:
+        if "error" in summary:
+            fallback["radiff2 error"] = summary["error"]
+        summary = fallback
+    return similarity, summary
+
+def fast_path(file1, file2):
+    try:
+        with tool_runner.stage("fast path"):
+            return fallback_diff.identical_code(file1, file2)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"{file2}: fast path check failed: {e}", flush=True)
+        return None
+
+def run_pair_analysis(file1, file2, time_budget=None):
+    # Rebuilds that only differ in build id, notes or debug data never reach radiff2
+    summary = fast_path(file1, file2)
+    if summary is not None:
+        print(f"{file2}: identical code, radiff2 skipped", flush=True)
+        return radigest.compare_checksec_properties(file1, file2), 1.0, 0, summary
+
+    cache_key = None
+    if RESULT_CACHE is not None:
+        cache_key = RESULT_CACHE.make_key(file1, file2, {
+            "similarity": radigest.SIMILARITY_FLAGS,
+            "functions": radigest.FUNCTION_DIFF_FLAGS,
+        })
+        lookup_start = time.monotonic()
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            print(f"{file2}: served from result cache", flush=True)
+            # Reported with the task's stages, the digest stays the same as an uncached run's
+            tool_runner.record_stage(CACHE_HIT_STAGE, time.monotonic() - lookup_start)
+            return cached["checksec"], cached["similarity"], cached["distance"], cached["summary"]
+
+    if time_budget == 0:
+        print(f"{file2}: predicted to overrun the time budget, skipping radiff2", flush=True)
+        checksec_props = radigest.compare_checksec_properties(file1, file2)
+        similarity, distance, summary = 0.0, -1, radigest.timeout_function_summary()
+    else:
+        print(f"{file2}: b4 similarity + func diffs")
+        timeout = {"timeout_sec": time_budget} if time_budget else {}
+        checksec_props, similarity, distance, summary = radiff_session.analyze_pair(file1, file2, **timeout)
+
+    if cache_key is not None and is_complete_pair_result(checksec_props, distance, summary):
+        RESULT_CACHE.put(cache_key, {
+            "checksec": checksec_props,
+            "similarity": similarity,
+            "distance": distance,
+            "summary": summary,
+        })
+    elif distance == -1 or summary.get("total_functions", -1) == -1:
+        similarity, summary = with_fallback(file1, file2, similarity, distance, summary)
+
+    return checksec_props, similarity, distance, summary
+
+def tier_fields(summary):
+    """Digest fields saying which analysis produced the function counts."""
+    fields = {"Analysis Tier": summary.get("tier", fallback_diff.TIER_RADIFF2)}
+    if "details" in summary:
+        fields["Fallback Analysis"] = summary["details"]
+    if "radiff2 error" in summary:
+        fields["Radiff2 Error"] = summary["radiff2 error"]
+    return fields
 
 def normalize_rel_path(rel_path: str) -> str:
     return APK_PREFIX_PATTERN.sub("", rel_path)
@@ -127,15 +287,7 @@ def format_checksec_summary(checksec_props):
     return "\n".join(lines)
 
 def is_tee_trusted_app(path):
-    try:
-        with open(path, "rb") as f:
-            header = f.read(16)
-            if header.startswith(b"SEC3") and b"\x7fELF" in header:
-                return True
-            if header.startswith(b"SEC2") and b"\x7fELF" in header:
-                return True
-    except Exception:
-        return False
+    return file_index.file_type(path) == "tee_ta"
 
 def strip_sec3_header(input_path, output_path):
     with open(input_path, "rb") as fin, open(output_path, "wb") as fout:
@@ -145,16 +297,14 @@ def strip_sec3_header(input_path, output_path):
             raise ValueError(f"ELF header not found in {input_path}")
         fout.write(data[elf_offset:])
 
-def analyze_tee_trusted_app(path, ta1_path, ta2_path, rc_bin_paths):
+def analyze_tee_trusted_app(path, ta1_path, ta2_path, rc_bin_paths, time_budget=None):
     tmp1 = tempfile.NamedTemporaryFile(delete=False, suffix=".ta.elf")
     tmp2 = tempfile.NamedTemporaryFile(delete=False, suffix=".ta.elf")
 
     strip_sec3_header(ta1_path, tmp1.name)
     strip_sec3_header(ta2_path, tmp2.name)
 
-    checksec_props = radigest.compare_checksec_properties(tmp1.name, tmp2.name)
-    similarity, distance = radigest.get_similarity_and_distance(tmp1.name, tmp2.name)
-    summary = radigest.parse_function_diffs(tmp1.name, tmp2.name)
+    checksec_props, similarity, distance, summary = run_pair_analysis(tmp1.name, tmp2.name, time_budget)
     total = summary["total_functions"]
     changed = summary["changed"]
 
@@ -170,7 +320,8 @@ def analyze_tee_trusted_app(path, ta1_path, ta2_path, rc_bin_paths):
         #"Mentioned in .rc": any(p.endswith(ta2_path) for p in rc_bin_paths),
         "TEE": True,
         "Hardening comparison": checksec_props,
-        "Obfuscated": False
+        "Obfuscated": False,
+        **tier_fields(summary),
     }
     
     ta2_path_str = os.path.abspath(str(ta2_path))
@@ -197,19 +348,26 @@ def analyze_tee_trusted_app(path, ta1_path, ta2_path, rc_bin_paths):
 
     return digest, formatted_summary
 
+def analyze_dex_diff(apk_path_1, apk_path_2):
+    try:
+        with tool_runner.stage("dex diff"):
+            result = dex_diff.diff_apk_dex(apk_path_1, apk_path_2)
+    except (ValueError, IndexError, KeyError, struct.error, zipfile.BadZipFile, zlib.error) as e:
+        return {"error": f"Error parsing dex: {e}"}
+    result["summary"] = dex_diff.summarize(result)
+    return result
+
+def apk_entry_prefix(apk_path, side):
+    # Same shape as the extraction dirs the digests used to be built from, categorize_path relies on it
+    return f"tmp/apk{side}_{Path(apk_path).stem}/"
+
 def analyze_apk_diff(apk_path_1, apk_path_2):
     apk_diff_formatted_summary = {}
-    tmp_dir1 = tempfile.mkdtemp(prefix="apk1_")
-    tmp_dir2 = tempfile.mkdtemp(prefix="apk2_")
     try:
-        subprocess.run(["unzip", "-q", apk_path_1, "-d", tmp_dir1], check=True)
-        subprocess.run(["unzip", "-q", apk_path_2, "-d", tmp_dir2], check=True)
-
-        diff_result = subprocess.run(
-            ["git", "diff", "--no-index", "--numstat", tmp_dir1, tmp_dir2],
-            capture_output=True, text=True
-        )
-        diff_output = diff_result.stdout.strip()
+        # Only entries that actually get reported are worth inflating for line counts
+        with tool_runner.stage("zip diff"):
+            changes = zip_diff.diff_archives(apk_path_1, apk_path_2,
+                                             wants_lines=lambda name: categorize_path("tmp/" + name) != "tier_3")
 
         tiered_changes = {
             "tier_1": [],
@@ -218,42 +376,12 @@ def analyze_apk_diff(apk_path_1, apk_path_2):
             "unclassified": []
         }
         dex_diff_outputs = {}
+        diff_lines = []
 
-        for line in diff_result.stdout.strip().splitlines():
-            parts = line.split("\t")
-            if len(parts) != 3:
-                continue
-            added, removed, path = parts
-            
-            raw_path = path.strip()          # Handle git rename/add/delete notation
-            if "=>" in raw_path:
-                # Convert Git-style brace expansion into two full paths
-                match = re.search(r'^(.*){(.+?) => (.+?)}(.*)$', raw_path)
-                if match:
-                    prefix, src_mid, dst_mid, suffix = match.groups()
-                    src_path = f"{prefix}{src_mid}{suffix}".strip()
-                    dst_path = f"{prefix}{dst_mid}{suffix}".strip()
-                else:
-                    # Fallback in case of other style like {file => dev/null}
-                    parts = raw_path.strip("{}").split("=>")
-                    src_path = parts[0].strip()
-                    dst_path = parts[1].strip()
-
-                if "dev/null" in src_path:
-                    rel_path = dst_path.split("/", 1)[-1]
-                    change_type = "added"
-                elif "dev/null" in dst_path:
-                    rel_path = src_path.split("/", 1)[-1]
-                    change_type = "deleted"
-                else:
-                    rel_path = dst_path.split("/", 1)[-1]
-                    change_type = "modified"
-            else:
-                rel_path = raw_path.split("/", 1)[-1] if "/" in raw_path else raw_path
-                change_type = "modified"
-
-            if not rel_path or rel_path.lower() == "null":
-                continue
+        for name, change_type, added, removed in changes:
+            side = 1 if change_type == "deleted" else 2
+            rel_path = apk_entry_prefix(apk_path_1 if side == 1 else apk_path_2, side) + name
+            diff_lines.append(f"{added}\t{removed}\t{rel_path}")
 
             tier = categorize_path(rel_path)
             change_entry = {
@@ -263,13 +391,14 @@ def analyze_apk_diff(apk_path_1, apk_path_2):
                 "change_type": change_type
             }
 
-            normalized_rel_path = normalize_rel_path(rel_path)
-            
             if tier != "tier_3":
                 tiered_changes[tier].append(change_entry)
 
         has_meaningful_diff = any(tiered_changes[t] for t in ["tier_1", "tier_2"])
 
+        if any(dex_diff.CLASSES_DEX_PATTERN.match(name) for name, _, _, _ in changes):
+            dex_diff_outputs = analyze_dex_diff(apk_path_1, apk_path_2)
+
         if has_meaningful_diff:
             apk_diff_formatted_summary = {
                 "apk": os.path.basename(apk_path_1),
@@ -278,32 +407,25 @@ def analyze_apk_diff(apk_path_1, apk_path_2):
                 "dex_diffs": dex_diff_outputs
             }
 
-        manifest_changed = any("AndroidManifest.xml" in line for line in diff_output.splitlines())
+        diff_output = "\n".join(diff_lines)
+        manifest_changed = any("AndroidManifest.xml" in line for line in diff_lines)
         manifest_status = "AndroidManifest.xml changed: yes" if manifest_changed else "AndroidManifest.xml changed: no"
 
         return diff_output + "\n\n" + manifest_status, apk_diff_formatted_summary
-    except subprocess.CalledProcessError as e:
+    except (zipfile.BadZipFile, zlib.error, OSError, NotImplementedError) as e:
         apk_diff_formatted_summary = {
             "apk": os.path.basename(apk_path_1),
             "priv-app": "priv-app" in apk_path_1,
             "error": f"Error processing APK diff: {e}"
         }
         return f"Error processing APK diff: {e}", apk_diff_formatted_summary
-    finally:
-        shutil.rmtree(tmp_dir1)
-        shutil.rmtree(tmp_dir2)
 
-def analyze_shared_lib_or_bin(path, so_path_1, so_path_2, rc_bin_json, rc_libs, is_shared_lib):
+def analyze_shared_lib_or_bin(path, so_path_1, so_path_2, rc_bin_json, rc_libs, is_shared_lib, time_budget=None):
     #is_shared_lib = so_match is not None
     lib_or_bin_name = basename(so_path_2)
     #print(rc_bin_json)
 
-    print(f"{so_path_2}: b4 checksec")
-    checksec_props = radigest.compare_checksec_properties(so_path_1, so_path_2)
-    print(f"{so_path_2}: b4 similarity + distance")
-    similarity, distance = radigest.get_similarity_and_distance(so_path_1, so_path_2)
-    print(f"{so_path_2}: b4 parsing func diffs")
-    summary = radigest.parse_function_diffs(so_path_1, so_path_2)
+    checksec_props, similarity, distance, summary = run_pair_analysis(so_path_1, so_path_2, time_budget)
     total = summary["total_functions"]
     changed = summary["changed"]
 
@@ -320,7 +442,8 @@ def analyze_shared_lib_or_bin(path, so_path_1, so_path_2, rc_bin_json, rc_libs,
         "Changed Unmatched Functions": summary['changed unmatched'],
         "Mentioned in .rc": lib_or_bin_name == "init",  # default fallback
         "TEE": False,
-        "Hardening comparison": checksec_props
+        "Hardening comparison": checksec_props,
+        **tier_fields(summary),
     }
 
     # Mentioned in .rc flag & metadata tracking
@@ -376,27 +499,11 @@ def analyze_shared_lib_or_bin(path, so_path_1, so_path_2, rc_bin_json, rc_libs,
     return digest, formatted_summary
 
 def is_sepolicy_file(path):
-    try:
-        result = subprocess.run(
-            ["file", path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return "SE Linux policy" in result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error running file on {path}: {e}")
-        return False
+    return file_index.is_sepolicy_file(path)
 
 def analyze_sepolicies(sepath_1, sepath_2):
     try:
-        result = subprocess.run(
-            ["sediff", "--stats", sepath_1, sepath_2],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout
+        return tool_runner.run(["sediff", "--stats", sepath_1, sepath_2])
     except subprocess.CalledProcessError as e:
         print(f"Error running analyzing sepolicies {sepath_1}, {sepath_2}")
         return False
@@ -407,11 +514,7 @@ def extract_tail_path(path, levels=3):
     return str(Path(*p.parts[-levels:]))
 
 def is_executable_elf(path):
-    try:
-        output = subprocess.check_output(["file", path], text=True)
-        return "ELF" in output and "executable" in output
-    except subprocess.CalledProcessError:
-        return False
+    return file_index.is_executable_elf(path)
 
 def wrap_json_with_topmost_key(original_json, topmost_key):
     if not isinstance(original_json, dict):
@@ -459,39 +562,53 @@ def reconstruct_paths(diff_path):
     new_path = f"{before}{new_part}{after}"
     return old_path, new_path
 
-def parse_diff_to_json(diff_text, bin_out, apk_out, se_out, rc_bin_paths=None, rc_libs=None):
-    if rc_bin_paths is None:
-        rc_bin_paths = []
-    if rc_libs is None:
-        rc_libs = {}
-
-    def add_to_hierarchy(path_parts, stats, current_dict, status_string, extra_analysis_info):
-        if len(path_parts) == 1:
-            current_dict[path_parts[0]] = {
-                "added": int(stats[0]) if stats[0] != "-" else "NONTEXT",
-                "deleted": int(stats[1]) if stats[1] != "-" else "NONTEXT",
-                "status": status_string,
-                "analysis": extra_analysis_info
-            }
-        else:
-            dir_name = path_parts[0]
-            if dir_name not in current_dict:
-                current_dict[dir_name] = {}
-            add_to_hierarchy(path_parts[1:], stats, current_dict[dir_name], status_string, extra_analysis_info)
-
-    root = {}
-    renamed_files = {}
-    tasks = []
-
-    formatted_bin_digests = {}
-    formatted_apk_digests = {}
-    formatted_sepolicy_digests = {}
-
-    lines = diff_text.strip().split("\n")
-
+def default_journal_path(bin_out, shard=None):
+    name = "json_dumper.journal.jsonl" if shard is None else f"json_dumper.journal.shard{shard[0]}of{shard[1]}.jsonl"
+    return os.path.join(os.path.dirname(bin_out), name)
+
+def default_metrics_path(bin_out, shard=None):
+    name = "json_dumper.metrics.jsonl" if shard is None else f"json_dumper.metrics.shard{shard[0]}of{shard[1]}.jsonl"
+    return os.path.join(os.path.dirname(bin_out), name)
+
+def input_bytes(task):
+    if task.task_type == "probe":
+        task = Task("bin" if task.args[0] == "elf" else task.args[0], task.args[1], task.output_key)
+    total = 0
+    for path in task_input_paths(task):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+def task_input_paths(task):
+    if task.task_type in ("bin", "tee"):
+        return task.args[1:3]
+    return task.args[:2]
+
+def add_to_hierarchy(path_parts, stats, current_dict, status_string, extra_analysis_info):
+    if len(path_parts) == 1:
+        current_dict[path_parts[0]] = {
+            "added": int(stats[0]) if stats[0] != "-" else "NONTEXT",
+            "deleted": int(stats[1]) if stats[1] != "-" else "NONTEXT",
+            "status": status_string,
+            "analysis": extra_analysis_info
+        }
+    else:
+        dir_name = path_parts[0]
+        if dir_name not in current_dict:
+            current_dict[dir_name] = {}
+        add_to_hierarchy(path_parts[1:], stats, current_dict[dir_name], status_string, extra_analysis_info)
+
+def set_hierarchy_analysis(root, path, extra_analysis_info):
+    node = root
+    for part in path.split("/"):
+        node = node[part]
+    node["analysis"] = extra_analysis_info
+
+def numstat_records(lines):
+    """Turns `git diff --no-index --numstat` lines into the records tree_diff.py writes."""
     brace_rename_pattern = re.compile(r'\{([^{}]+) => ([^{}]+)\}(/.+)')
-    so_pattern = re.compile(r'\{([^{}]+)\s*=>\s*([^{}]+)\}[^{}]*\/([\w.-]+\.so)')
-    apk_pattern = re.compile(r'([\w./-]+\.apk)')
 
     for line in lines:
         parts = line.split()
@@ -499,143 +616,323 @@ def parse_diff_to_json(diff_text, bin_out, apk_out, se_out, rc_bin_paths=None, r
             continue
 
         added, deleted = parts[:2]
-        path = parts[2]
-        status = ""
-        extra_analysis = ""
+        record = {"added": added, "deleted": deleted}
 
         if "=>" in line:
             if parts[2].startswith("{") and parts[3] == "=>":
                 match = brace_rename_pattern.search(line)
-                if match:
-                    if "/" in match.group(1) or "/" in match.group(2):
-                        old_prefix, new_prefix, suffix = match.groups()
-                        old_path = old_prefix + suffix
-                        new_path = new_prefix + suffix
-                        status = "renamed"
-                        renamed_files[new_path] = {
-                            "old_path": old_path,
-                            "added": int(added) if added.isdigit() else 0,
-                            "deleted": int(deleted) if deleted.isdigit() else 0,
-                            "analysis": ""
-                        }
-                        continue
-
-                path = parts[2] + parts[3] + parts[4]
-                status = "modified"
-                so_match = so_pattern.search(path)
-                apk_match = apk_pattern.search(path)
-                so_path_1, so_path_2 = reconstruct_paths(path)
-
-                if apk_match:
-                    apk_path_1, apk_path_2 = reconstruct_paths(path)
-                    tasks.append(Task("apk", (apk_path_1, apk_path_2), extract_tail_path(apk_path_1, 4)))
-
-                elif "tee" in path:
-                    ta1_path, ta2_path = reconstruct_paths(path)
-                    if is_tee_trusted_app(ta2_path):
-                        tasks.append(Task("tee", (path, ta1_path, ta2_path, rc_bin_paths), extract_tail_path(ta2_path, 4)))
-                    elif looks_encrypted(ta2_path):
-                        formatted_bin_digests[extract_tail_path(ta2_path, 4)] = {"TEE": True, "Obfuscated": True}
-                        extra_analysis = "TEE: true;\nObfuscated: true"
-                
-                elif "trusty" in path:
-                    ta1_path, ta2_path = reconstruct_paths(path)
-                    tasks.append(Task("tee", (path, ta1_path, ta2_path, rc_bin_paths), extract_tail_path(ta2_path, 4)))
-
-
-                elif "sepolicy" in path:
-                    sepath_1, sepath_2 = reconstruct_paths(path)
-                    if is_sepolicy_file(sepath_2):
-                        tasks.append(Task("se", (sepath_1, sepath_2), extract_tail_path(sepath_2, 4)))
-
-                elif so_match or radigest.is_executable_elf(so_path_2):
-                    tasks.append(Task("bin", (path, so_path_1, so_path_2, rc_bin_paths, rc_libs, so_match is not None), extract_tail_path(so_path_2, 4)))
-
-                elif "security/cacerts" in path:
-                    cert1, cert2 = reconstruct_paths(path)
-                    are_different = cert_equivalence.main(cert1, cert2)
-                    if are_different:
-                        result = subprocess.run(
-                            ["git", "diff", "--no-index", cert1, cert2],
-                            capture_output=True,
-                            text=True,
-                        )
-                        extra_analysis = result.stdout
-
+                if match and ("/" in match.group(1) or "/" in match.group(2)):
+                    old_prefix, new_prefix, suffix = match.groups()
+                    record.update(status="renamed", old=old_prefix + suffix, new=new_prefix + suffix)
+                else:
+                    old_path, new_path = reconstruct_paths(parts[2] + parts[3] + parts[4])
+                    record.update(status="modified", old=old_path, new=new_path)
             elif parts[2] == "/dev/null" and parts[3] == "=>":
-                path = parts[4]
-                status = "added"
-                if "security/cacerts" in path:
-                    with open(path) as f:
-                        extra_analysis = f.read()
-
+                record.update(status="added", old=None, new=parts[4])
             elif parts[4] == "/dev/null" and parts[3] == "=>":
-                path = parts[2]
-                status = "deleted"
-                if "security/cacerts" in path:
-                    with open(path) as f:
-                        extra_analysis = f.read()
-
+                record.update(status="deleted", old=parts[2], new=None)
             elif parts[3] == "=>":
-                old_path = parts[2]
-                path = parts[4]
-                status = "renamed"
-                renamed_files[path] = {
+                record.update(status="renamed", old=parts[2], new=parts[4])
+            else:
+                record.update(status="modified", old=parts[4], new=parts[4])
+        else:
+            record.update(status="modified", old=parts[2], new=parts[2])
+
+        yield record
+
+def diff_records(diff_file):
+    """Records from either a tree_diff.py JSON lines file or a git numstat, whichever diff_file is."""
+    lines = iter(diff_file)
+    for first in lines:
+        if first.strip():
+            break
+    else:
+        return
+    lines = itertools.chain([first], lines)
+    if first.lstrip().startswith("{\""):
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from numstat_records(lines)
+
+def classify_records(records, rc_bin_paths, rc_libs, renamed_files):
+    """
+    Yields (path, stats, status, extra_analysis, task) for every changed file, as soon as
+    its record is read. path is the git-style hierarchy path ("{fw1=>fw2}/..." for modified
+    files), task is the pool task the file needs, or None. Anything that has to touch
+    the file itself (TA/sepolicy/ELF probes, cert diffs) is left to the pool as well.
+    Renames are recorded in renamed_files and not yielded.
+    """
+    so_pattern = re.compile(r'\{([^{}]+)\s*=>\s*([^{}]+)\}[^{}]*\/([\w.-]+\.so)')
+    apk_pattern = re.compile(r'([\w./-]+\.apk)')
+
+    for record in records:
+        added, deleted = str(record["added"]), str(record["deleted"])
+        status = record["status"]
+        extra_analysis = ""
+        task = None
+
+        if status == "renamed":
+            old_path, new_path = record["old"], record["new"]
+            if tree_diff.display_path(old_path, new_path).startswith("{"):
+                renamed_files[new_path] = {
+                    "old_path": old_path,
+                    "added": int(added) if added.isdigit() else 0,
+                    "deleted": int(deleted) if deleted.isdigit() else 0,
+                    "analysis": ""
+                }
+            else:
+                renamed_files[new_path] = {
                     "old_path": old_path,
                     "added": added,
                     "deleted": deleted,
                     "status": "renamed",
                     "analysis": ""
                 }
-                continue
-            else:
-                path = parts[4]
-                status = "modified"
+            continue
+
+        elif status == "added":
+            path = record["new"]
+            if "security/cacerts" in path:
+                with open(path) as f:
+                    extra_analysis = f.read()
+
+        elif status == "deleted":
+            path = record["old"]
+            if "security/cacerts" in path:
+                with open(path) as f:
+                    extra_analysis = f.read()
+
         else:
-            path = parts[2]
-            status = "modified"
+            so_path_1, so_path_2 = record["old"], record["new"]
+            path = so_path_2 if so_path_1 == so_path_2 else tree_diff.display_path(so_path_1, so_path_2).replace(" => ", "=>")
+            so_match = so_pattern.search(path)
+            apk_match = apk_pattern.search(path)
+
+            # With a file index loaded the type is known up front and no probe is needed
+            new_type = file_index.indexed_type(so_path_2)
+
+            if apk_match or new_type == "apk":
+                task = Task("apk", (so_path_1, so_path_2), extract_tail_path(so_path_1, 4))
+
+            elif new_type == "tee_ta":
+                task = Task("tee", (path, so_path_1, so_path_2, rc_bin_paths), extract_tail_path(so_path_2, 4))
+
+            elif "tee" in path:
+                # Still probed when not a plain TA: encrypted TAs only show up by their entropy
+                task = Task("probe", ("tee", (path, so_path_1, so_path_2, rc_bin_paths)), extract_tail_path(so_path_2, 4))
+
+            elif "trusty" in path:
+                task = Task("tee", (path, so_path_1, so_path_2, rc_bin_paths), extract_tail_path(so_path_2, 4))
+
+            elif new_type == "sepolicy":
+                task = Task("se", (so_path_1, so_path_2), extract_tail_path(so_path_2, 4))
+
+            elif "sepolicy" in path and new_type is None:
+                task = Task("probe", ("se", (so_path_1, so_path_2)), extract_tail_path(so_path_2, 4))
+
+            elif so_match or new_type == "elf_exec":
+                task = Task("bin", (path, so_path_1, so_path_2, rc_bin_paths, rc_libs, so_match is not None), extract_tail_path(so_path_2, 4))
+
+            elif "security/cacerts" in path:
+                task = Task("cert", (path, so_path_1, so_path_2), path)
+
+            elif new_type is None:
+                task = Task("probe", ("elf", (path, so_path_1, so_path_2, rc_bin_paths, rc_libs, False)), extract_tail_path(so_path_2, 4))
+
+        yield path, (added, deleted), status, extra_analysis, task
+
+def planning_cost(task, size_model):
+    """Size-only cost estimate, the same on every machine that has the firmware trees."""
+    if task.task_type == "probe":
+        kind, args = task.args
+        if kind == "elf":
+            # Most probed files turn out not to be executables at all
+            if not file_index.is_executable_elf(args[2]):
+                return 0.0
+            return size_model.estimate("bin", task.output_key, args[1:3])
+        task = Task(kind if kind == "tee" else "se", args, task.output_key)
+    return size_model.estimate(task.task_type, task.output_key, task_input_paths(task))
+
+def write_task_plan(path, tasks, costs, assignment):
+    with open(path, "w") as f:
+        for task in tasks:
+            f.write(json.dumps({
+                "task_type": task.task_type if task.task_type != "probe" else f"probe:{task.args[0]}",
+                "output_key": task.output_key,
+                "cost": round(costs[task.output_key], 3),
+                "shard": assignment[task.output_key],
+            }) + "\n")
+
+def parse_shard(value):
+    index, count = (int(part) for part in value.split("/"))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard must be i/N with 0 <= i < N, got {value}")
+    return index, count
+
+def parse_diff_to_json(diff_lines, bin_out, apk_out, se_out, rc_bin_paths=None, rc_libs=None, workers=None, history_path=DEFAULT_HISTORY_PATH,
+                       journal_path=None, resume=False, shard=None, emit_tasks=None, memory_budget=None, time_budget=None,
+                       metrics_path=None, retry_timeouts=False):
+    if rc_bin_paths is None:
+        rc_bin_paths = []
+    if rc_libs is None:
+        rc_libs = {}
+    if isinstance(diff_lines, str):
+        diff_lines = diff_lines.strip().split("\n")
 
-        path_parts = path.split("/")
-        add_to_hierarchy(path_parts, (added, deleted), root, status, extra_analysis)
+    root = {}
+    renamed_files = {}
 
-    # Sort to help small tasks finish earlier (optional)
-    tasks.sort(key=lambda t: {"apk": 0, "se": 1, "tee": 2, "bin": 3}[t.task_type])
+    entries = classify_records(diff_records(diff_lines), rc_bin_paths, rc_libs, renamed_files)
+    assignment = None
+    if shard is not None or emit_tasks is not None:
+        # Balancing shards needs the whole task list up front, so no streaming here
+        entries = list(entries)
+        shard_index, shard_count = shard or (0, 1)
+        tasks = [task for *_, task in entries if task is not None]
+        size_model = CostModel(None)
+        costs = {task.output_key: planning_cost(task, size_model) for task in tasks}
+        assignment, loads = plan_shards(costs, shard_count)
+        print(f"Planned {len(tasks)} tasks into {shard_count} shards, estimated cost per shard: " +
+              ", ".join(f"{load:.0f}s" for load in loads), flush=True)
+        if emit_tasks is not None:
+            write_task_plan(emit_tasks, tasks, costs, assignment)
+            print(f"Task plan written to {emit_tasks}", flush=True)
+            return None
 
-    # Run all analysis tasks in parallel
-    with ProcessPoolExecutor(max_workers=12) as executor:
-        futures = [executor.submit(execute_task, task) for task in tasks]
-        for future in as_completed(futures):
-            result = future.result()
-            if not result:
+    # Every finished result goes to the journal first, the digests are merged from it at the end
+    if journal_path is None:
+        journal_path = default_journal_path(bin_out, shard)
+    journal = ResultJournal(journal_path, resume, retry_timeouts)
+
+    cost_model = CostModel(history_path)
+    if workers is None:
+        # With admission control memory is rationed per task, otherwise by worker count
+        workers = os.cpu_count() if memory_budget else default_worker_count()
+    print(f"Running analysis tasks on {workers} workers" +
+          (f", memory budget {memory_budget / 1024 ** 3:.1f} GiB" if memory_budget else ""), flush=True)
+
+    if metrics_path is None:
+        metrics_path = default_metrics_path(bin_out, shard)
+    metrics = MetricsLog(metrics_path, workers, resume)
+    progress = Progress(workers)
+
+    cache_stats_before = RESULT_CACHE.stats() if RESULT_CACHE is not None else None
+
+    # Which hierarchy node a task belongs to, for results that annotate it
+    task_paths = {}
+    counts = {"queued": 0, "skipped": 0, "over budget": 0, "fast path": 0, "pairs": 0}
+
+    def annotate(task, category, value):
+        if category == "cert" and isinstance(value, str):
+            set_hierarchy_analysis(root, task_paths[task.output_key], value)
+        elif value == OBFUSCATED_TEE and task.output_key in task_paths:
+            set_hierarchy_analysis(root, task_paths[task.output_key], OBFUSCATED_TEE_ANALYSIS)
+
+    def submit(task):
+        if task.output_key in journal:
+            category, value = journal.entries[task.output_key]
+            annotate(task, category, value)
+            counts["skipped"] += 1
+            return
+        if task.task_type == "probe":
+            # Probes are cheap and unlock the real work, dispatch them right away
+            cost = float("inf")
+        else:
+            cost = cost_model.estimate(task.task_type, task.output_key, task_input_paths(task))
+            if time_budget and task.task_type in ("bin", "tee"):
+                # Pairs that would blow the budget go straight to the fallback tiers
+                task = task._replace(time_budget=0 if cost > time_budget else time_budget)
+                if task.time_budget == 0:
+                    counts["over budget"] += 1
+        scheduler.push(task, cost, cost_model.estimate_memory(task.task_type, task.output_key, task_input_paths(task)))
+        counts["queued"] += 1
+
+    def handle(task, estimated, result, run):
+        value = result[2] if result and isinstance(result[2], dict) else {}
+        peak_rss = run.peak_rss
+        if value.get("oom"):
+            # Next run should plan for at least what this one was not allowed to have
+            peak_rss = max(peak_rss, value["memory_limit"])
+        short_circuited = value.get("Analysis Tier") == fallback_diff.TIER_FAST_PATH
+        if short_circuited:
+            counts["fast path"] += 1
+        # A pair that skipped radiff2, was served from the result cache or failed says nothing
+        # about how long radiff2 takes or how much memory it needs
+        if (task.task_type != "probe" and task.time_budget != 0 and not short_circuited
+                and CACHE_HIT_STAGE not in run.stages and "error" not in value):
+            cost_model.record(task.task_type, task.output_key, task_input_paths(task), run.elapsed, peak_rss)
+        if task.task_type in ("bin", "tee"):
+            counts["pairs"] += 1
+        metrics.record(task.task_type, task.output_key, run, input_bytes(task), estimated, value.get("Analysis Tier"))
+        progress.task_done(estimated, run.elapsed)
+        if not result:
+            return
+        category, key, value = result
+        if category == "task":
+            submit(value)
+            return
+        journal.append(category, key, value)
+        annotate(task, category, value)
+
+    # Tasks go to the pool while the diff is still being read, most expensive first
+    # among whatever is pending so no huge library starts last
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # A worker killed from outside (OOM killer) breaks the pool: its tasks are journaled
+        # as errors for --resume and the rest run on a new pool
+        scheduler = TaskScheduler(executor, execute_task, max_in_flight=workers, memory_budget=memory_budget,
+                                  on_error=failed_task_result,
+                                  make_executor=lambda: ProcessPoolExecutor(max_workers=workers))
+
+        for path, stats, status, extra_analysis, task in entries:
+            add_to_hierarchy(path.split("/"), stats, root, status, extra_analysis)
+            if task is None:
+                continue
+            if assignment is not None and assignment[task.output_key] != shard_index:
                 continue
-            category, key, value = result
-
-            if category == "bin":
-                formatted_bin_digests[key] = value
-            elif category == "tee":
-                formatted_bin_digests[key] = value
-            elif category == "apk":
-                if value:
-                    formatted_apk_digests[key] = value
-            elif category == "se":
-                formatted_sepolicy_digests[key] = value
+            if task.task_type in ("probe", "cert"):
+                task_paths[task.output_key] = path
+            submit(task)
+            for done_task, estimated, result, run in scheduler.completed(timeout=0):
+                handle(done_task, estimated, result, run)
+                progress.update(*scheduler.remaining())
+
+        print(f"Diff parsed: {counts['queued']} tasks queued, {counts['skipped']} already in the journal" +
+              (f", {counts['over budget']} predicted over the time budget" if time_budget else ""), flush=True)
+
+        for done_task, estimated, result, run in scheduler.run():
+            handle(done_task, estimated, result, run)
+            progress.update(*scheduler.remaining())
+        progress.update(0, 0, force=True)
+        scheduler.close()
+
+    cost_model.save()
+    journal.close()
+    metrics.close()
+    print(f"Task metrics written to {metrics_path} (report: python3 task_metrics.py {metrics_path})", flush=True)
+
+    if RESULT_CACHE is not None:
+        print("[CACHE] " + format_stats_delta(cache_stats_before, RESULT_CACHE.stats()), flush=True)
+    print(f"[FAST PATH] {counts['fast path']} of {counts['pairs']} ELF pairs had identical code "
+          f"apart from volatile sections, radiff2 skipped", flush=True)
 
     # Output results
-    with open(bin_out, "w") as f:
-        json.dump(formatted_bin_digests, f, indent=2)
-
-    with open(apk_out, "w") as f:
-        json.dump(formatted_apk_digests, f, indent=2)
-
-    with open(se_out, "w") as f:
-        json.dump(formatted_sepolicy_digests, f, indent=2)
+    write_digests(journal.digests(), bin_out, apk_out, se_out)
 
     root["__renamed__"] = renamed_files
     print("ABOUT TO RETURN FROM JSON DUMPER")
     return root
 
-def dump_json(filename, bins_in_rc, elf_libs_file, bin_out, apk_out, se_out, topmost_key = None):
-    diff_text = open(filename, "r").read()
+def dump_json(filename, bins_in_rc, elf_libs_file, bin_out, apk_out, se_out, topmost_key = None, cache_dir=None, cache_max_gb=5,
+              workers=None, history_path=DEFAULT_HISTORY_PATH, journal_path=None, resume=False, file_indexes=(),
+              shard=None, emit_tasks=None, memory_budget=None, time_budget=None, metrics_path=None, retry_timeouts=False):
+    global RESULT_CACHE
+    if cache_dir is not None:
+        RESULT_CACHE = ResultCache(cache_dir, int(cache_max_gb * 1024 ** 3))
+    # Loaded before the pool forks, workers look file types up instead of probing
+    for index_path in file_indexes:
+        file_index.use_index(file_index.load_index(index_path))
 
     full_rc_bin_paths = []
     rc_libs = {}
@@ -646,7 +943,14 @@ def dump_json(filename, bins_in_rc, elf_libs_file, bin_out, apk_out, se_out, top
     with open(elf_libs_file) as f:
         rc_libs = json.load(f)
 
-    result = parse_diff_to_json(diff_text, bin_out, apk_out, se_out, full_rc_bin_paths, rc_libs)
+    # Stream the diff so the first tasks start while the rest is still being classified
+    with open(filename, "r") as diff_file:
+        result = parse_diff_to_json(diff_file, bin_out, apk_out, se_out, full_rc_bin_paths, rc_libs,
+                                    workers=workers, history_path=history_path, journal_path=journal_path, resume=resume,
+                                    shard=shard, emit_tasks=emit_tasks, memory_budget=memory_budget, time_budget=time_budget,
+                                    metrics_path=metrics_path, retry_timeouts=retry_timeouts)
+    if result is None:
+        return None
 
     if topmost_key is not None:
         result = wrap_json_with_topmost_key(result, topmost_key)
@@ -669,9 +973,36 @@ if __name__ == "__main__":
     parser.add_argument("bin_digest_output", help="Binary digest output (json)")
     parser.add_argument("apk_digest_output", help="APK digest output (json)")
     parser.add_argument("sepolicy_digest_output", help="SELinux policy digest output (json)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the radiff2/checksec result cache")
+    parser.add_argument("--cache-max-gb", type=float, default=5, help="Evict least recently used cache entries above this size")
+    parser.add_argument("--no-cache", action="store_true", help="Always run the tools, ignore the result cache")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: from CPU count and available memory)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="Per-task runtime history used to schedule expensive tasks first")
+    parser.add_argument("--journal", default=None, help="Result journal (default: json_dumper.journal.jsonl next to the bin digest)")
+    parser.add_argument("--metrics", default=None, help="Per-task telemetry (default: json_dumper.metrics.jsonl next to the bin digest)")
+    parser.add_argument("--resume", action="store_true", help="Keep the existing journal and skip every task already recorded in it")
+    parser.add_argument("--retry-timeouts", action="store_true",
+                        help="With --resume, also rerun tasks journaled as timed out (e.g. after raising --time-budget)")
+    parser.add_argument("--file-index", action="append", default=[], help="File type index from file_index.py (repeat for each firmware tree)")
+    parser.add_argument("--memory-budget-gb", type=float, default=None,
+                        help="Admit tasks only while their estimated peak memory fits (default: 80%% of available memory, 0 disables)")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Seconds radiff2 may spend on one ELF pair; pairs predicted to take longer only get the fallback tiers")
+    parser.add_argument("--shard", type=parse_shard, default=None, help="Only run shard i of N (\"i/N\"), combine the shards with merge_shards.py")
+    parser.add_argument("--emit-tasks", default=None, help="Write the task list (with the shard of each task for --shard's N) to this file and exit")
     
     args = parser.parse_args()
-    res = dump_json(args.diff_file, args.bins_in_rc, args.elf_libs, args.bin_digest_output, args.apk_digest_output, args.sepolicy_digest_output)
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.memory_budget_gb is None:
+        memory_budget = default_memory_budget()
+    else:
+        memory_budget = int(args.memory_budget_gb * 1024 ** 3) or None
+    res = dump_json(args.diff_file, args.bins_in_rc, args.elf_libs, args.bin_digest_output, args.apk_digest_output, args.sepolicy_digest_output,
+                    cache_dir=cache_dir, cache_max_gb=args.cache_max_gb, workers=args.workers, history_path=args.history,
+                    journal_path=args.journal, resume=args.resume, file_indexes=args.file_index,
+                    shard=args.shard, emit_tasks=args.emit_tasks, memory_budget=memory_budget, time_budget=args.time_budget,
+                    metrics_path=args.metrics, retry_timeouts=args.retry_timeouts)
     #print(res)
-    with open(args.gen_output, "w") as f:
-        f.write(res)
+    if res is not None:
+        with open(args.gen_output, "w") as f:
+            f.write(res)
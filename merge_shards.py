@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import argparse
+import json
+
+
+def merge_digests(paths):
+    merged = {}
+    for path in paths:
+        with open(path) as f:
+            merged.update(json.load(f))
+    return merged
+
+
+def merge_tree(into, other):
+    """
+    Every shard parses the whole diff, so the trees have the same shape. They only
+    differ in the analysis of files whose task ran on that shard (cert diffs,
+    obfuscated TEEs), keep whichever is non-empty.
+    """
+    for key, value in other.items():
+        if key not in into:
+            into[key] = value
+        elif isinstance(value, dict) and isinstance(into[key], dict):
+            if "status" in value and "analysis" in value:
+                if not into[key].get("analysis") and value["analysis"]:
+                    into[key]["analysis"] = value["analysis"]
+            else:
+                merge_tree(into[key], value)
+    return into
+
+
+def merge_trees(paths):
+    merged = {}
+    for path in paths:
+        with open(path) as f:
+            merge_tree(merged, json.load(f))
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Combine the outputs of json_dumper.py --shard i/N runs into the files of a single run. "
+                    "Each option takes the output path followed by the per-shard files.")
+    parser.add_argument("--bin", nargs="+", metavar="PATH", help="Merged bin digest, then the shard bin digests")
+    parser.add_argument("--apk", nargs="+", metavar="PATH", help="Merged apk digest, then the shard apk digests")
+    parser.add_argument("--se", nargs="+", metavar="PATH", help="Merged sepolicy digest, then the shard sepolicy digests")
+    parser.add_argument("--tree", nargs="+", metavar="PATH", help="Merged JSON mapping, then the shard JSON mappings")
+    args = parser.parse_args()
+
+    for option, merge in (("bin", merge_digests), ("apk", merge_digests), ("se", merge_digests), ("tree", merge_trees)):
+        paths = getattr(args, option)
+        if not paths:
+            continue
+        if len(paths) < 2:
+            parser.error(f"--{option} needs an output path and at least one shard file")
+        merged = merge(paths[1:])
+        with open(paths[0], "w") as f:
+            json.dump(merged, f, indent=4 if option == "tree" else 2)
+        print(f"Merged {len(paths) - 1} shard files into {paths[0]} ({len(merged)} top-level entries)")
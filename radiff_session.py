@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import time
+
+import summarize_radiff as radigest
+import tool_runner
+
+
+def analyze_pair(file1, file2, timeout_sec=3600):
+    """
+    All radiff2 work for one ELF pair. The byte-level `radiff2 -s` distance needs no
+    analysis, so it runs alongside `radiff2 -AC` instead of after it; both load the pair.
+    Returns (checksec_props, similarity, distance, function_summary).
+    """
+    deadline = time.monotonic() + timeout_sec
+    similarity_proc = tool_runner.popen(
+        ["radiff2", *radigest.SIMILARITY_FLAGS, file1, file2],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        checksec_props = radigest.compare_checksec_properties(file1, file2)
+        summary = radigest.parse_function_diffs(file1, file2, timeout_sec=max(int(deadline - time.monotonic()), 1))
+
+        try:
+            output, _ = tool_runner.communicate(similarity_proc, timeout=max(deadline - time.monotonic(), 1))
+            similarity, distance = radigest.parse_similarity_output(output)
+        except subprocess.TimeoutExpired:
+            print(f"Timeout in get_similarity_and_distance for {file1} {file2}")
+            similarity, distance = 0.0, -1
+
+    except Exception:
+        # Don't leave the byte diff running behind a task that is being failed
+        if similarity_proc.returncode is None:
+            tool_runner.kill(similarity_proc)
+        raise
+
+    return checksec_props, similarity, distance, summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: radiff_session.py <old.so> <new.so>")
+        sys.exit(1)
+
+    checksec_props, similarity, distance, summary = analyze_pair(sys.argv[1], sys.argv[2])
+    radigest.print_summary(os.path.basename(sys.argv[2]), summary, similarity, distance)
+    print(checksec_props)
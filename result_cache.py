@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Bump when the layout of cached values changes so stale entries are never served
+CACHE_SCHEMA_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/thesis/radiff")
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def radiff2_version():
+    try:
+        output = subprocess.check_output(["radiff2", "-v"], text=True, stderr=subprocess.DEVNULL)
+        return output.strip().splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return "unknown"
+
+
+class ResultCache:
+    """
+    Content-addressed store for per-pair analysis results.
+    Entries live in <cache_dir>/<key[:2]>/<key>.json, the least recently used ones
+    are evicted once the store grows past max_bytes. Safe to share between the
+    worker processes of one run and between concurrent runs.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats_path = os.path.join(cache_dir, "stats.json")
+        self.lock_path = os.path.join(cache_dir, ".lock")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, file1, file2, flags):
+        material = {
+            "schema": CACHE_SCHEMA_VERSION,
+            "old": file_sha256(file1),
+            "new": file_sha256(file2),
+            "radiff2": radiff2_version(),
+            "flags": flags,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_stats(self):
+        try:
+            with open(self.stats_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes": 0}
+
+    def _write_stats(self, stats):
+        tmp = self.stats_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(stats, f)
+        os.replace(tmp, self.stats_path)
+
+    def _bump(self, **deltas):
+        with self._locked():
+            stats = self._read_stats()
+            for name, delta in deltas.items():
+                stats[name] = stats.get(name, 0) + delta
+            self._write_stats(stats)
+            return stats
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self._bump(misses=1)
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._bump(hits=1)
+        return value
+
+    def put(self, key, value):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        size = os.path.getsize(tmp)
+        # An overwritten entry's bytes are already counted
+        try:
+            size -= os.path.getsize(path)
+        except OSError:
+            pass
+        os.replace(tmp, path)
+
+        stats = self._bump(stores=1, bytes=size)
+        if stats["bytes"] > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        with self._locked():
+            entries = []
+            total = 0
+            for sub in os.scandir(self.cache_dir):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".json"):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+
+            # Drop down to 90% of the budget so we don't evict on every store
+            target = int(self.max_bytes * 0.9)
+            evicted = 0
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+
+            stats = self._read_stats()
+            stats["bytes"] = total
+            stats["evictions"] = stats.get("evictions", 0) + evicted
+            self._write_stats(stats)
+
+    def stats(self):
+        with self._locked():
+            return self._read_stats()
+
+
+def format_stats_delta(before, after):
+    hits = after.get("hits", 0) - before.get("hits", 0)
+    misses = after.get("misses", 0) - before.get("misses", 0)
+    lookups = hits + misses
+    rate = hits / lookups if lookups else 0.0
+    return (
+        f"cache hits: {hits}, misses: {misses} ({rate:.1%} hit rate), "
+        f"evictions: {after.get('evictions', 0) - before.get('evictions', 0)}, "
+        f"size: {after.get('bytes', 0) / 1024 ** 2:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[1] not in ("stats", "clear"):
+        print("Usage: result_cache.py <stats|clear> [cache_dir]")
+        sys.exit(1)
+
+    cache = ResultCache(sys.argv[2] if len(sys.argv) == 3 else DEFAULT_CACHE_DIR)
+    if sys.argv[1] == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        cache.max_bytes = 0
+        cache.evict()
+        print(f"Cleared {cache.cache_dir}")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+
+DIGEST_CATEGORIES = ("bin", "apk", "se")
+
+
+class ResultJournal:
+    """
+    Append-only JSONL record of finished json_dumper tasks, one line per task:
+    {"category": ..., "key": <output_key>, "value": ...}. Every line is flushed
+    and fsynced as soon as the task completes, so a crash loses at most the
+    tasks that were still running.
+    """
+
+    def __init__(self, path, resume=False, retry_timeouts=False):
+        self.path = path
+        self.retry_timeouts = retry_timeouts
+        self.entries = {}
+        if resume:
+            self.entries = self.load(path)
+            print(f"Resuming from {path}: {len(self.entries)} tasks already done", flush=True)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a" if resume else "w")
+        if resume and self._file.tell() > 0:
+            # Terminate a torn last line so the next record starts on its own line
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    @staticmethod
+    def load(path):
+        entries = {}
+        if not os.path.exists(path):
+            return entries
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line from a killed run
+                    continue
+                entries[record["key"]] = (record["category"], record["value"])
+        return entries
+
+    def __contains__(self, key):
+        # Tasks that crashed or ran out of memory are not considered done, a resumed run retries them.
+        # Timed out ones only with retry_timeouts: with the same time limit they mostly time out again
+        if key not in self.entries:
+            return False
+        value = self.entries[key][1]
+        if not isinstance(value, dict):
+            return True
+        return not ("error" in value or value.get("oom") or (self.retry_timeouts and value.get("timeout")))
+
+    def append(self, category, key, value):
+        self.entries[key] = (category, value)
+        self._file.write(json.dumps({"category": category, "key": key, "value": value}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def digests(self):
+        return merge_entries(self.entries)
+
+
+def merge_entries(entries):
+    digests = {category: {} for category in DIGEST_CATEGORIES}
+    for key, (category, value) in entries.items():
+        if category == "tee":
+            category = "bin"
+        if category == "apk" and not value:
+            continue
+        if category not in digests:
+            # e.g. cert diffs, those only annotate the hierarchy
+            continue
+        digests[category][key] = value
+    return digests
+
+
+def write_digests(digests, bin_out, apk_out, se_out):
+    for category, path in (("bin", bin_out), ("apk", apk_out), ("se", se_out)):
+        with open(path, "w") as f:
+            json.dump(digests[category], f, indent=2)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print("Usage: result_journal.py <journal.jsonl> <bin_digest_output> <apk_digest_output> <sepolicy_digest_output>")
+        sys.exit(1)
+
+    write_digests(merge_entries(ResultJournal.load(sys.argv[1])), *sys.argv[2:])
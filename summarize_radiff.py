@@ -2,42 +2,49 @@ import subprocess
 import re
 import sys
 from pathlib import Path
-import json
+import elf_reader
+import file_index
+import tool_runner
+
+SIMILARITY_FLAGS = ["-n", "-s", "-e", "bin.relocs.apply=true"]
+FUNCTION_DIFF_FLAGS = ["-n", "-AC", "-e", "bin.relocs.apply=true"]
 
 def is_executable_elf(path):
-    try:
-        output = subprocess.check_output(["file", path], text=True)
-        return "ELF" in output and "executable" in output
-    except subprocess.CalledProcessError:
-        return False
+    return file_index.is_executable_elf(path)
+
+def parse_similarity_output(output):
+    match = re.search(r"similarity:\s+([0-9.]+)\s+distance:\s+(\d+)", output)
+    if match:
+        similarity = float(match.group(1))
+        distance = int(match.group(2))
+        return similarity, distance
+    return 0.0, -1
 
 def get_similarity_and_distance(file1, file2, timeout_sec=2700):
-    cmd = [
-        "radiff2", "-n", "-s",
-        "-e", "bin.relocs.apply=true",
-        file1, file2
-    ]
+    cmd = ["radiff2", *SIMILARITY_FLAGS, file1, file2]
     try:
-        output = subprocess.check_output(cmd, text=True, timeout=timeout_sec, stderr=subprocess.DEVNULL)
-        match = re.search(r"similarity:\s+([0-9.]+)\s+distance:\s+(\d+)", output)
-        if match:
-            similarity = float(match.group(1))
-            distance = int(match.group(2))
-            return similarity, distance
+        output = tool_runner.run(cmd, timeout=timeout_sec)
+        return parse_similarity_output(output)
     except subprocess.CalledProcessError as e:
         print("Error running radiff2 -s:", e)
     except subprocess.TimeoutExpired:
         print(f"Timeout in get_similarity_and_distance for {file1} {file2}")
     return 0.0, -1
 
+def timeout_function_summary():
+    return {
+        "total_functions": -1,
+        "identical": -1,
+        "changed": -1,  # Any non-NEW function with sim < 1.0
+        "changed matched": -1,
+        "changed unmatched": -1,
+        "new": -1,
+    }
+
 def parse_function_diffs(file1, file2, timeout_sec=3600):
-    cmd = [
-        "radiff2", "-n", "-AC",
-        "-e", "bin.relocs.apply=true",
-        file1, file2
-    ]
+    cmd = ["radiff2", *FUNCTION_DIFF_FLAGS, file1, file2]
     try:
-        output = subprocess.check_output(cmd, text=True, timeout=timeout_sec, stderr=subprocess.DEVNULL)
+        output = tool_runner.run(cmd, timeout=timeout_sec)
     except subprocess.CalledProcessError as e:
         print("Error running radiff2 -AC:", e)
         return {
@@ -51,16 +58,11 @@ def parse_function_diffs(file1, file2, timeout_sec=3600):
         }
     except subprocess.TimeoutExpired:
         print(f"Timeout in parse_function_diffs! {file1} {file2}")
-        summary = {
-            "total_functions": -1,
-            "identical": -1,
-            "changed": -1,  # Any non-NEW function with sim < 1.0
-            "changed matched": -1,
-            "changed unmatched": -1,
-            "new": -1,
-        }
-        return summary
+        return timeout_function_summary()
+
+    return summarize_function_diff_output(output)
 
+def summarize_function_diff_output(output):
     func_lines = [line for line in output.splitlines() if re.search(r'\b(MATCH|UNMATCH|NEW)\b', line)]
 
     summary = {
@@ -99,9 +101,8 @@ def compare_checksec_properties(file1, file2):
     import re
 
     def run_checksec(path):
-        cmd = ["checksec", "--format=json", f"--file={path}"]
-        output = subprocess.check_output(cmd, text=True)
-        return json.loads(output)[path]
+        # Native reader, same keys and values as `checksec --format=json`
+        return elf_reader.hardening_properties(path)
 
     def classify(value):
         value = str(value).lower()
@@ -121,9 +122,10 @@ def compare_checksec_properties(file1, file2):
             return None
 
     try:
-        props1 = run_checksec(file1)
-        props2 = run_checksec(file2)
-    except subprocess.CalledProcessError as e:
+        with tool_runner.stage("checksec"):
+            props1 = run_checksec(file1)
+            props2 = run_checksec(file2)
+    except (OSError, ValueError) as e:
         return {
             "error": f"Error running checksec on {file1} or {file2}: {e}"
         }
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import time
+
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 10
+# Width of the utilization bars in the report
+BAR_WIDTH = 40
+
+
+class MetricsLog:
+    """
+    JSONL telemetry of a json_dumper run. The first line of every run is
+    {"event": "run", "started": ..., "workers": ...}, then one {"event": "task", ...}
+    line per finished task with its timings, peak RSS, input size and stage times.
+    """
+
+    def __init__(self, path, workers, resume=False):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # A resumed run adds to the metrics of the runs before it, like the journal
+        self._file = open(path, "a" if resume else "w")
+        self._write({"event": "run", "started": time.time(), "workers": workers})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def record(self, task_type, key, run, input_bytes, estimated=None, tier=None):
+        record = {
+            "event": "task",
+            "type": task_type,
+            "key": key,
+            "started": round(run.started, 3),
+            "finished": round(run.finished, 3),
+            "queue_wait": round(run.queue_wait, 3),
+            "wall": round(run.elapsed, 3),
+            "cpu": round(run.cpu, 3),
+            "peak_rss": run.peak_rss,
+            "input_bytes": input_bytes,
+            "stages": {name: round(seconds, 3) for name, seconds in run.stages.items()},
+        }
+        if estimated is not None and estimated != float("inf"):
+            record["estimated"] = round(estimated, 3)
+        if tier is not None:
+            record["tier"] = tier
+        self._write(record)
+
+    def close(self):
+        self._file.close()
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """
+    Prints a progress line with an ETA at most every PROGRESS_INTERVAL seconds. The ETA is the
+    estimated cost of what is left spread over the workers, corrected by how far the
+    estimates of the finished tasks were off.
+    """
+
+    def __init__(self, workers, interval=PROGRESS_INTERVAL):
+        self.workers = workers
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_print = 0.0
+        self.done = 0
+        self.actual = 0.0
+        self.estimated = 0.0
+
+    def task_done(self, estimated, elapsed):
+        self.done += 1
+        if estimated is not None and estimated != float("inf"):
+            self.actual += elapsed
+            self.estimated += estimated
+
+    def eta(self, remaining_cost):
+        ratio = self.actual / self.estimated if self.estimated else 1.0
+        return remaining_cost * ratio / self.workers
+
+    def update(self, remaining_tasks, remaining_cost, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_print < self.interval:
+            return
+        self.last_print = now
+        print(f"[PROGRESS] {self.done} done, {remaining_tasks} left | "
+              f"{format_duration(now - self.started)} elapsed | "
+              f"ETA {format_duration(self.eta(remaining_cost))}", flush=True)
+
+
+def load_runs(path):
+    """List of (run_record, [task_records]) in file order."""
+    runs = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("event") == "run":
+                runs.append((record, []))
+            elif record.get("event") == "task" and runs:
+                runs[-1][1].append(record)
+    return runs
+
+
+def slowest_tasks(tasks, top):
+    lines = [f"Slowest {min(top, len(tasks))} tasks:",
+             f"  {'wall':>9} {'cpu':>9} {'queued':>9} {'rss MiB':>8} {'in MiB':>7}  {'slowest stage':<24} task"]
+    for task in sorted(tasks, key=lambda t: t["wall"], reverse=True)[:top]:
+        stages = task.get("stages") or {}
+        slowest = max(stages, key=stages.get) if stages else "-"
+        stage_text = f"{slowest} {format_duration(stages[slowest])}" if stages else "-"
+        tier = f" [{task['tier']}]" if task.get("tier") else ""
+        lines.append(f"  {format_duration(task['wall']):>9} {format_duration(task['cpu']):>9} "
+                     f"{format_duration(task['queue_wait']):>9} {task['peak_rss'] / 2 ** 20:8.0f} "
+                     f"{task['input_bytes'] / 2 ** 20:7.1f}  {stage_text:<24} {task['type']}:{task['key']}{tier}")
+    return lines
+
+
+def stage_totals(tasks):
+    totals = {}
+    for task in tasks:
+        for name, seconds in (task.get("stages") or {}).items():
+            count, total, longest = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (count + 1, total + seconds, max(longest, seconds))
+    wall = sum(task["wall"] for task in tasks) or 1.0
+    lines = ["Per-stage totals (stages of one task can overlap):",
+             f"  {'stage':<16} {'tasks':>6} {'total':>10} {'max':>9} {'of wall':>8}"]
+    for name, (count, total, longest) in sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True):
+        lines.append(f"  {name:<16} {count:6d} {format_duration(total):>10} {format_duration(longest):>9} {total / wall:8.1%}")
+    return lines
+
+
+def type_totals(tasks):
+    totals = {}
+    for task in tasks:
+        entry = totals.setdefault(task["type"], [0, 0.0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += task["wall"]
+        entry[2] += task["cpu"]
+        entry[3] += task["queue_wait"]
+    lines = ["Per-type totals:",
+             f"  {'type':<8} {'tasks':>6} {'wall':>10} {'cpu':>10} {'avg queued':>10}"]
+    for task_type, (count, wall, cpu, queued) in sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True):
+        lines.append(f"  {task_type:<8} {count:6d} {format_duration(wall):>10} {format_duration(cpu):>10} "
+                     f"{format_duration(queued / count):>10}")
+    return lines
+
+
+def utilization(run, tasks, buckets):
+    """Share of the workers busy per time slice of the run."""
+    if not tasks:
+        return []
+    start = run["started"]
+    end = max(task["finished"] for task in tasks)
+    width = max((end - start) / buckets, 1.0)
+    buckets = max(min(buckets, math.ceil((end - start) / width)), 1)
+    busy = [0.0] * buckets
+    for task in tasks:
+        for i in range(buckets):
+            lo = start + i * width
+            overlap = min(task["finished"], lo + width) - max(task["started"], lo)
+            if overlap > 0:
+                busy[i] += overlap
+    lines = [f"Pool utilization ({run['workers']} workers, {format_duration(width)} per row):"]
+    for i, seconds in enumerate(busy):
+        share = min(seconds / (width * run["workers"]), 1.0)
+        bar = "#" * round(share * BAR_WIDTH)
+        lines.append(f"  +{format_duration(i * width)} |{bar:<{BAR_WIDTH}}| {share:5.1%}")
+    return lines
+
+
+def report(path, top=20, buckets=20):
+    runs = load_runs(path)
+    if not runs:
+        return f"No runs recorded in {path}"
+    lines = []
+    for number, (run, tasks) in enumerate(runs, 1):
+        wall = max((task["finished"] for task in tasks), default=run["started"]) - run["started"]
+        lines.append(f"=== Run {number}/{len(runs)}: {len(tasks)} tasks on {run['workers']} workers, "
+                     f"{format_duration(wall)} wall ===")
+        if not tasks:
+            continue
+        for section in (slowest_tasks(tasks, top), stage_totals(tasks), type_totals(tasks),
+                        utilization(run, tasks, buckets)):
+            lines.append("")
+            lines.extend(section)
+        lines.append("")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report on the task metrics written by json_dumper.py")
+    parser.add_argument("metrics", help="Metrics file (json_dumper.metrics.jsonl next to the bin digest by default)")
+    parser.add_argument("--top", type=int, default=20, help="How many of the slowest tasks to list")
+    parser.add_argument("--buckets", type=int, default=20, help="Rows of the pool utilization timeline")
+    args = parser.parse_args()
+
+    print(report(args.metrics, args.top, args.buckets))
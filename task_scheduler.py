@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+import fcntl
+import hashlib
+import heapq
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import elf_reader
+import tool_runner
+
+DEFAULT_HISTORY_PATH = os.path.expanduser("~/.cache/thesis/task_runtimes.json")
+# Top-level directories of a firmware tree that history keys are made relative to
+PARTITIONS = ("system", "system_ext", "product", "vendor", "odm", "oem",
+              "system_dlkm", "vendor_dlkm", "odm_dlkm", "apex")
+# Rough peak footprint of one radiff2 worker, used to cap the pool on small boxes
+PER_WORKER_MEMORY = 2 * 1024 ** 3
+
+# Seconds per MiB of input before any history is available to calibrate against
+DEFAULT_SECONDS_PER_MIB = {
+    "bin": 30.0,
+    "tee": 30.0,
+    "apk": 0.5,
+    "se": 5.0,
+}
+MIB = 1024 ** 2
+
+# Peak RSS before any history: fixed overhead plus bytes per byte of input
+# (code bytes for ELF pairs, r2's analysis of big libraries runs into gigabytes)
+DEFAULT_MEMORY = {
+    "bin": (256 * MIB, 40.0),
+    "tee": (256 * MIB, 40.0),
+    "apk": (128 * MIB, 3.0),
+    "se": (512 * MIB, 10.0),
+}
+SMALL_TASK_MEMORY = 64 * MIB
+# Headroom on top of a task's observed peak when it runs again
+MEMORY_HEADROOM = 1.25
+# Per-child address space limit relative to the estimated peak RSS (mappings count too)
+CHILD_LIMIT_FACTOR = 2
+MIN_CHILD_LIMIT = 1024 * MIB
+# How far down the queue to look for a task that fits the remaining memory
+ADMISSION_SCAN = 32
+
+# What a finished task cost: wall and CPU seconds (worker plus its tools), peak RSS of its
+# tools, wall-clock start/end, seconds it waited in the queue and wall seconds per stage
+TaskRun = namedtuple("TaskRun", ["elapsed", "cpu", "peak_rss", "started", "finished", "queue_wait", "stages"])
+
+
+def available_memory():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def default_memory_budget():
+    # Leave a fifth of what is free for the OS and the parent process
+    memory = available_memory()
+    return int(memory * 0.8) if memory is not None else None
+
+
+def default_worker_count(per_worker_memory=PER_WORKER_MEMORY):
+    workers = os.cpu_count() or 1
+    memory = available_memory()
+    if memory is not None:
+        workers = min(workers, max(1, memory // per_worker_memory))
+    return workers
+
+
+def history_key(task_type, output_key):
+    # Key on the path from the partition down, so runtimes carry over between version pairs
+    # without system/lib64/x.so and vendor/lib64/x.so sharing an entry
+    parts = output_key.split("/")
+    for i, part in enumerate(parts):
+        if part in PARTITIONS:
+            parts = parts[i:]
+            break
+    return f"{task_type}:{'/'.join(parts)}"
+
+
+def code_size(path):
+    # ELF inputs are dominated by the size of their executable sections
+    try:
+        with elf_reader.ElfFile(path) as elf:
+            size = sum(sec.sh_size for sec in elf.sections if sec.sh_flags & elf_reader.SHF_EXECINSTR)
+            if size:
+                return size
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class CostModel:
+    """
+    Estimates how long a task will take, in seconds. Known tasks use their last
+    measured runtime; unknown ones use input size times a per-type rate that is
+    calibrated from the history when there is enough of it.
+    """
+
+    def __init__(self, history_path=DEFAULT_HISTORY_PATH):
+        self.history_path = history_path
+        self.history = {}
+        # Keys measured by this run, the only ones save() writes over
+        self.recorded = set()
+        if history_path and os.path.exists(history_path):
+            try:
+                with open(history_path) as f:
+                    self.history = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable task history {history_path}: {e}")
+        self.rates = dict(DEFAULT_SECONDS_PER_MIB)
+        for task_type in self.rates:
+            samples = [
+                entry["seconds"] / (entry["size"] / MIB)
+                for key, entry in self.history.items()
+                if key.startswith(task_type + ":") and entry.get("size")
+            ]
+            if len(samples) >= 5:
+                self.rates[task_type] = statistics.median(samples)
+
+        self.memory = dict(DEFAULT_MEMORY)
+        for task_type, (base, per_byte) in DEFAULT_MEMORY.items():
+            samples = [
+                max(entry["rss"] - base, 0) / entry["size"]
+                for key, entry in self.history.items()
+                if key.startswith(task_type + ":") and entry.get("size") and entry.get("rss")
+            ]
+            if len(samples) >= 5:
+                self.memory[task_type] = (base, statistics.median(samples))
+
+    def input_size(self, task_type, paths):
+        if task_type in ("bin", "tee"):
+            return sum(code_size(p) for p in paths)
+        total = 0
+        for p in paths:
+            try:
+                total += os.path.getsize(p)
+            except OSError:
+                pass
+        return total
+
+    def estimate(self, task_type, output_key, paths):
+        entry = self.history.get(history_key(task_type, output_key))
+        if entry:
+            return entry["seconds"]
+        size = self.input_size(task_type, paths)
+        return size / MIB * self.rates.get(task_type, 1.0)
+
+    def estimate_memory(self, task_type, output_key, paths):
+        """Expected peak RSS in bytes of the tools a task starts."""
+        entry = self.history.get(history_key(task_type, output_key))
+        if entry and entry.get("rss"):
+            return int(entry["rss"] * MEMORY_HEADROOM)
+        if task_type not in self.memory:
+            return SMALL_TASK_MEMORY
+        base, per_byte = self.memory[task_type]
+        return int(base + per_byte * self.input_size(task_type, paths))
+
+    def record(self, task_type, output_key, paths, seconds, rss=None):
+        entry = {
+            "seconds": round(seconds, 3),
+            "size": self.input_size(task_type, paths),
+        }
+        if rss:
+            entry["rss"] = rss
+        key = history_key(task_type, output_key)
+        self.history[key] = entry
+        self.recorded.add(key)
+
+    def save(self):
+        """Merges this run's measurements into the history file; concurrent shards each add theirs."""
+        if not self.history_path:
+            return
+        directory = os.path.dirname(self.history_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(self.history_path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                history = {}
+                if os.path.exists(self.history_path):
+                    try:
+                        with open(self.history_path) as f:
+                            history = json.load(f)
+                    except (OSError, ValueError) as e:
+                        print(f"Replacing unreadable task history {self.history_path}: {e}")
+                history.update((key, self.history[key]) for key in self.recorded)
+                fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(history, f, indent=2)
+                os.replace(tmp, self.history_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.history = history
+
+
+def stable_hash(key):
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def plan_shards(costs, shard_count):
+    """
+    Splits {key: cost} into shard_count shards of similar total cost. Greedy
+    longest-first onto the least loaded shard, ties broken by a stable hash of the
+    key, so every machine computes the same assignment from the same inputs.
+    """
+    loads = [0.0] * shard_count
+    assignment = {}
+    for key in sorted(costs, key=lambda k: (-costs[k], stable_hash(k))):
+        shard = min(range(shard_count), key=lambda i: (loads[i], i))
+        assignment[key] = shard
+        loads[shard] += costs[key]
+    return assignment, loads
+
+
+def child_memory_limit(memory, budget):
+    limit = max(memory * CHILD_LIMIT_FACTOR, MIN_CHILD_LIMIT)
+    return min(limit, budget) if budget else limit
+
+
+def run_timed(fn, task, memory_limit=None):
+    # Runs in the worker: every tool the task starts gets the limit, and its peak RSS is tracked
+    tool_runner.set_memory_limit(memory_limit)
+    tool_runner.reset_stats()
+    started = time.time()
+    start = time.monotonic()
+    cpu_start = time.process_time()
+    result = fn(task)
+    run = TaskRun(
+        elapsed=time.monotonic() - start,
+        cpu=time.process_time() - cpu_start + tool_runner.CHILD_CPU,
+        peak_rss=tool_runner.PEAK_RSS,
+        started=started,
+        finished=time.time(),
+        queue_wait=0.0,
+        stages=dict(tool_runner.STAGE_TIMES),
+    )
+    return result, run
+
+
+class TaskScheduler:
+    """
+    Longest-processing-time-first dispatch on top of a ProcessPoolExecutor.
+    Only max_in_flight tasks are handed to the pool at a time, so whenever a
+    worker frees up it picks the most expensive task that is still pending
+    instead of whatever happened to be submitted next.
+    With a memory_budget, a task is only admitted while the estimated peak RSS
+    of everything in flight still fits; a task that would not fit waits (cheaper
+    ones behind it may go first), and one that does not fit even on its own runs
+    alone. Each task's tools are capped at a multiple of its estimate.
+    A task whose future raises is reported with on_error(task, exception) as its
+    result. When a worker dies (e.g. at the hands of the OOM killer) every task in
+    flight fails that way, and the pool is replaced with make_executor() before
+    the next task is handed out.
+    """
+
+    def __init__(self, executor, fn, max_in_flight, memory_budget=None, on_error=None, make_executor=None):
+        self.executor = executor
+        self.fn = fn
+        self.max_in_flight = max_in_flight
+        self.memory_budget = memory_budget
+        self.on_error = on_error
+        self.make_executor = make_executor
+        self.broken = False
+        self.replaced = []
+        self.pending = []
+        self.in_flight = {}
+        self._counter = 0
+
+    def push(self, task, cost, memory=0):
+        # The counter keeps equal-cost tasks in discovery order
+        heapq.heappush(self.pending, (-cost, self._counter, task, memory, time.time()))
+        self._counter += 1
+
+    def memory_in_flight(self):
+        return sum(entry[2] for entry in self.in_flight.values())
+
+    def _next_admissible(self):
+        if not self.memory_budget or not self.in_flight:
+            return heapq.heappop(self.pending)
+        free = self.memory_budget - self.memory_in_flight()
+        skipped = []
+        chosen = None
+        while self.pending and len(skipped) < ADMISSION_SCAN:
+            entry = heapq.heappop(self.pending)
+            if entry[3] <= free:
+                chosen = entry
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self.pending, entry)
+        return chosen
+
+    def _replace_executor(self):
+        print("[POOL] A worker process died, starting a new pool", flush=True)
+        self.executor.shutdown(wait=False)
+        self.executor = self.make_executor()
+        self.replaced.append(self.executor)
+        self.broken = False
+
+    def pump(self):
+        if self.broken:
+            # The broken pool's other futures fail too, collect them before replacing it
+            if self.in_flight:
+                return
+            self._replace_executor()
+        while self.pending and len(self.in_flight) < self.max_in_flight:
+            entry = self._next_admissible()
+            if entry is None:
+                break
+            neg_cost, _, task, memory, pushed = entry
+            limit = child_memory_limit(memory, self.memory_budget) if self.memory_budget else None
+            future = self.executor.submit(run_timed, self.fn, task, limit)
+            self.in_flight[future] = (task, -neg_cost, memory, pushed, time.time())
+
+    def has_work(self):
+        return bool(self.pending or self.in_flight)
+
+    def remaining(self):
+        """(tasks pending or running, their summed estimated cost) - probes have no finite cost."""
+        costs = [-entry[0] for entry in self.pending] + [entry[1] for entry in self.in_flight.values()]
+        return len(costs), sum(cost for cost in costs if cost != float("inf"))
+
+    def completed(self, timeout=None):
+        """Yields (task, estimated_cost, result, TaskRun) for tasks that finished."""
+        self.pump()
+        if not self.in_flight:
+            return
+        done, _ = wait(list(self.in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            task, cost, _, pushed, submitted = self.in_flight.pop(future)
+            try:
+                result, run = future.result()
+            except Exception as e:
+                if self.on_error is None or (isinstance(e, BrokenProcessPool) and self.make_executor is None):
+                    raise
+                self.broken |= isinstance(e, BrokenProcessPool)
+                finished = time.time()
+                result = self.on_error(task, e)
+                run = TaskRun(elapsed=finished - submitted, cpu=0.0, peak_rss=0, started=submitted,
+                              finished=finished, queue_wait=0.0, stages={})
+            yield task, cost, result, run._replace(queue_wait=max(run.started - pushed, 0.0))
+        self.pump()
+
+    def close(self):
+        """Shuts down the pools started in place of broken ones, the one passed in is the caller's."""
+        for executor in self.replaced:
+            executor.shutdown()
+
+    def run(self):
+        while self.has_work():
+            yield from self.completed()
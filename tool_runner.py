@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import os
+import re
+import resource
+import selectors
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Address space cap for every tool started from this process, set per task by the scheduler
+MEMORY_LIMIT = None
+# Largest peak RSS of any tool reaped since the last set_memory_limit()
+PEAK_RSS = 0
+# A tool that fails after using this much of its limit is taken to have run out of memory
+EXCEEDED_FRACTION = 0.5
+# ...or that says so on stderr. Under RLIMIT_AS big allocations fail long before RSS gets close
+ALLOCATION_FAILURE = re.compile(rb"(?i)cannot allocate|out of memory|bad_alloc|MemoryError|alloc(ation)? failed")
+# Wall seconds per stage (tool invocation or in-process step) and CPU seconds of reaped
+# tools since the last reset_stats()
+STAGE_TIMES = {}
+CHILD_CPU = 0.0
+
+
+class MemoryLimitExceeded(Exception):
+    def __init__(self, cmd, limit, peak_rss):
+        super().__init__(f"{cmd[0]} ran out of memory (limit {limit >> 20} MiB, peak RSS {peak_rss >> 20} MiB)")
+        self.cmd = cmd
+        self.limit = limit
+        self.peak_rss = peak_rss
+
+
+def set_memory_limit(limit):
+    global MEMORY_LIMIT, PEAK_RSS
+    MEMORY_LIMIT = limit
+    PEAK_RSS = 0
+
+
+def reset_stats():
+    global CHILD_CPU
+    STAGE_TIMES.clear()
+    CHILD_CPU = 0.0
+
+
+def record_stage(name, seconds):
+    STAGE_TIMES[name] = STAGE_TIMES.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_stage(name, time.monotonic() - start)
+
+
+def stage_name(cmd):
+    # radiff2 is run in several modes, keep them apart
+    tool = os.path.basename(cmd[0])
+    if tool == "radiff2":
+        modes = [arg for arg in cmd[1:] if arg in ("-s", "-AC", "-A", "-C")]
+        return " ".join([tool, *modes])
+    return tool
+
+
+def _limit_address_space(limit):
+    def apply():
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return apply
+
+
+def popen(cmd, **kwargs):
+    if MEMORY_LIMIT:
+        kwargs["preexec_fn"] = _limit_address_space(MEMORY_LIMIT)
+    proc = subprocess.Popen(cmd, **kwargs)
+    proc.started = time.monotonic()
+    return proc
+
+
+def reap(proc, timeout=None, check_memory=True):
+    """
+    Waits for proc with wait4 so its own peak RSS is known, not just the worker's.
+    Raises MemoryLimitExceeded when it died after using most of its memory limit.
+    """
+    global PEAK_RSS, CHILD_CPU
+    if proc.returncode is not None:
+        return proc.returncode
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        try:
+            pid, status, usage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        except ChildProcessError:
+            proc.returncode = proc.poll() or 0
+            return proc.returncode
+        if pid:
+            break
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        time.sleep(0.05)
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    peak_rss = usage.ru_maxrss * 1024
+    PEAK_RSS = max(PEAK_RSS, peak_rss)
+    CHILD_CPU += usage.ru_utime + usage.ru_stime
+    if hasattr(proc, "started"):
+        record_stage(stage_name(proc.args), time.monotonic() - proc.started)
+    if (check_memory and MEMORY_LIMIT and proc.returncode != 0
+            and peak_rss >= EXCEEDED_FRACTION * MEMORY_LIMIT):
+        raise MemoryLimitExceeded(proc.args, MEMORY_LIMIT, peak_rss)
+    return proc.returncode
+
+
+def kill(proc):
+    proc.kill()
+    reap(proc, check_memory=False)
+
+
+def communicate(proc, timeout=None):
+    """Reads proc's stdout to EOF and reaps it, returns (output, returncode)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    chunks = []
+    fd = proc.stdout.fileno()
+    with selectors.DefaultSelector() as selector:
+        selector.register(fd, selectors.EVENT_READ)
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                kill(proc)
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            if not selector.select(remaining):
+                continue
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            chunks.append(data)
+    proc.stdout.close()
+    remaining = None if deadline is None else max(deadline - time.monotonic(), 1)
+    try:
+        returncode = reap(proc, remaining)
+    except subprocess.TimeoutExpired:
+        kill(proc)
+        raise
+    return b"".join(chunks).decode(errors="replace"), returncode
+
+
+def run(cmd, timeout=None):
+    """check_output() replacement that applies the memory limit and tracks peak RSS."""
+    with tempfile.TemporaryFile() as stderr:
+        proc = popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        output, returncode = communicate(proc, timeout)
+        if returncode != 0:
+            stderr.seek(0)
+            if MEMORY_LIMIT and ALLOCATION_FAILURE.search(stderr.read()[-65536:]):
+                raise MemoryLimitExceeded(cmd, MEMORY_LIMIT, PEAK_RSS)
+            raise subprocess.CalledProcessError(returncode, cmd, output)
+    return output
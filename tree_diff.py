@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from zip_diff import is_binary, count_lines, line_stats, BINARY_SNIFF_BYTES
+
+
+def hash_entry(path, chunk_size=1024 * 1024):
+    # Symlinks are compared by their target, like git does
+    if os.path.islink(path):
+        return hashlib.sha256(os.readlink(path).encode()).hexdigest()
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_entry(path):
+    if os.path.islink(path):
+        return os.readlink(path).encode()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def list_tree(root):
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path) or os.path.isfile(path):
+                entries.append(os.path.relpath(path, root))
+    return entries
+
+
+def hash_tree(root, executor):
+    rel_paths = list_tree(root)
+    hashes = executor.map(lambda rel: hash_entry(os.path.join(root, rel)), rel_paths)
+    return dict(zip(rel_paths, hashes))
+
+
+def single_side_stats(path, side):
+    """numstat counts for a file that only exists on one side ("added"/"deleted")."""
+    if not os.path.islink(path):
+        with open(path, "rb") as f:
+            if is_binary(f.read(BINARY_SNIFF_BYTES)):
+                return "-", "-"
+    lines = str(count_lines(read_entry(path)))
+    return (lines, "0") if side == "added" else ("0", lines)
+
+
+def pair_stats(paths):
+    old, new = paths
+    for path in paths:
+        if not os.path.islink(path):
+            with open(path, "rb") as f:
+                if is_binary(f.read(BINARY_SNIFF_BYTES)):
+                    return "-", "-"
+    return line_stats(read_entry(old), read_entry(new))
+
+
+def display_path(old, new):
+    """git's pprint_rename: "{old => new}" around the differing middle of two paths."""
+    pfx_length = 0
+    i = 0
+    while i < len(old) and i < len(new) and old[i] == new[i]:
+        if old[i] == "/":
+            pfx_length = i + 1
+        i += 1
+
+    sfx_length = 0
+    i, j = len(old) - 1, len(new) - 1
+    while i >= pfx_length - 1 and j >= pfx_length - 1 and i >= 0 and j >= 0 and old[i] == new[j]:
+        if old[i] == "/":
+            sfx_length = len(old) - i
+        i -= 1
+        j -= 1
+
+    old_mid = old[pfx_length:max(pfx_length, len(old) - sfx_length)]
+    new_mid = new[pfx_length:max(pfx_length, len(new) - sfx_length)]
+    if pfx_length + sfx_length:
+        return f"{old[:pfx_length]}{{{old_mid} => {new_mid}}}{old[len(old) - sfx_length:]}"
+    return f"{old} => {new}"
+
+
+def pair_renames(deleted, added, old_hashes, new_hashes):
+    """Exact renames: deleted and added files with the same content, same basename preferred."""
+    by_hash = {}
+    for rel in sorted(deleted):
+        by_hash.setdefault(old_hashes[rel], []).append(rel)
+    renames = {}
+    for rel in sorted(added):
+        candidates = by_hash.get(new_hashes[rel])
+        if not candidates:
+            continue
+        same_name = [c for c in candidates if os.path.basename(c) == os.path.basename(rel)]
+        source = (same_name or candidates)[0]
+        candidates.remove(source)
+        renames[rel] = source
+    return renames
+
+
+def diff_trees(fw1, fw2, workers=None):
+    """
+    Returns one record per changed file, sorted by path:
+    {"status": modified|added|deleted|renamed, "old": .., "new": .., "added": .., "deleted": ..}
+    Counts are strings like git --numstat prints them, "-" for binaries.
+    """
+    fw1 = os.path.normpath(fw1)
+    fw2 = os.path.normpath(fw2)
+    workers = workers or os.cpu_count() or 1
+
+    # hashlib drops the GIL on big buffers, threads are enough for the hashing
+    with ThreadPoolExecutor(max_workers=workers * 2) as executor:
+        old_hashes = hash_tree(fw1, executor)
+        new_hashes = hash_tree(fw2, executor)
+
+    modified = sorted(rel for rel in old_hashes if rel in new_hashes and old_hashes[rel] != new_hashes[rel])
+    deleted = set(old_hashes) - set(new_hashes)
+    added = set(new_hashes) - set(old_hashes)
+    renames = pair_renames(deleted, added, old_hashes, new_hashes)
+    deleted -= set(renames.values())
+    added -= set(renames)
+
+    records = []
+    # Line diffs are pure Python, those get real processes
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pairs = [(os.path.join(fw1, rel), os.path.join(fw2, rel)) for rel in modified]
+        for (old, new), (n_added, n_deleted) in zip(pairs, executor.map(pair_stats, pairs, chunksize=16)):
+            records.append({"status": "modified", "old": old, "new": new, "added": n_added, "deleted": n_deleted})
+
+        for status, rels, root in (("deleted", sorted(deleted), fw1), ("added", sorted(added), fw2)):
+            paths = [os.path.join(root, rel) for rel in rels]
+            stats = executor.map(single_side_stats, paths, [status] * len(paths), chunksize=64)
+            for path, (n_added, n_deleted) in zip(paths, stats):
+                records.append({
+                    "status": status,
+                    "old": path if status == "deleted" else None,
+                    "new": path if status == "added" else None,
+                    "added": n_added,
+                    "deleted": n_deleted,
+                })
+
+    for new_rel, old_rel in renames.items():
+        # Same content on both sides, only binary or not matters for the counts
+        count = "-" if pair_stats((os.path.join(fw2, new_rel),) * 2) == ("-", "-") else "0"
+        records.append({"status": "renamed", "old": os.path.join(fw1, old_rel), "new": os.path.join(fw2, new_rel),
+                        "added": count, "deleted": count})
+
+    records.sort(key=lambda r: r["new"] or r["old"])
+    return records
+
+
+def to_numstat(record):
+    if record["status"] == "added":
+        path = f"/dev/null => {record['new']}"
+    elif record["status"] == "deleted":
+        path = f"{record['old']} => /dev/null"
+    else:
+        path = display_path(record["old"], record["new"])
+    return f"{record['added']}\t{record['deleted']}\t{path}"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Content-hash diff of two extracted firmware trees (JSON lines on stdout)")
+    parser.add_argument("fw1")
+    parser.add_argument("fw2")
+    parser.add_argument("--workers", type=int, default=None, help="Worker threads/processes (default: all cores)")
+    parser.add_argument("--numstat", action="store_true", help="Print git diff --numstat style lines instead of records")
+    args = parser.parse_args()
+
+    records = diff_trees(args.fw1, args.fw2, args.workers)
+    for record in records:
+        print(to_numstat(record) if args.numstat else json.dumps(record))
+    print(f"{len(records)} changed files", file=sys.stderr)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import difflib
+import sys
+import zipfile
+from collections import Counter
+
+# git treats a blob as binary when a NUL shows up in its first 8000 bytes
+BINARY_SNIFF_BYTES = 8000
+# SequenceMatcher is quadratic in the worst case: above this many old x new differing lines,
+# count the lines present on one side only instead
+MAX_MATCHED_LINE_PAIRS = 4 * 1000 ** 2
+
+
+def read_central_directory(zf):
+    entries = {}
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        entries[info.filename] = info
+    return entries
+
+
+def is_binary(data):
+    return b"\0" in data[:BINARY_SNIFF_BYTES]
+
+
+def count_lines(data):
+    if not data:
+        return 0
+    return data.count(b"\n") + (0 if data.endswith(b"\n") else 1)
+
+
+def line_stats(old, new):
+    """
+    (added, removed) like git --numstat, "-" for binary content. Past MAX_MATCHED_LINE_PAIRS
+    the counts are those of the lines found on one side only, a lower bound of git's.
+    """
+    if (old is not None and is_binary(old)) or (new is not None and is_binary(new)):
+        return "-", "-"
+    if old is None:
+        return str(count_lines(new)), "0"
+    if new is None:
+        return "0", str(count_lines(old))
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    # Unchanged head and tail never need matching
+    start = 0
+    while start < min(len(old_lines), len(new_lines)) and old_lines[start] == new_lines[start]:
+        start += 1
+    end = 0
+    while (end < min(len(old_lines), len(new_lines)) - start
+           and old_lines[-1 - end] == new_lines[-1 - end]):
+        end += 1
+    old_lines = old_lines[start:len(old_lines) - end]
+    new_lines = new_lines[start:len(new_lines) - end]
+    if len(old_lines) * len(new_lines) > MAX_MATCHED_LINE_PAIRS:
+        # Linear estimate, lines that only moved count as unchanged
+        old_counts, new_counts = Counter(old_lines), Counter(new_lines)
+        return str(sum((new_counts - old_counts).values())), str(sum((old_counts - new_counts).values()))
+    added = removed = 0
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete"):
+            removed += i2 - i1
+        if tag in ("replace", "insert"):
+            added += j2 - j1
+    return str(added), str(removed)
+
+
+def diff_archives(path1, path2, wants_lines=lambda name: True):
+    """
+    Compares two zip archives by their central directories and returns a list of
+    (name, change_type, added, removed) for every entry that differs, sorted by name.
+    Entries count as equal when CRC-32 and size match, nothing is inflated for them.
+    Differing entries are only read when wants_lines(name) is true, otherwise their
+    line counts are reported as "-".
+    Entries that only moved (same CRC-32 and size under a new name) are reported
+    once, as modified under the new name, like git's rename detection does.
+    """
+    with zipfile.ZipFile(path1) as zf1, zipfile.ZipFile(path2) as zf2:
+        old = read_central_directory(zf1)
+        new = read_central_directory(zf2)
+
+        deleted = {name for name in old if name not in new}
+        added = {name for name in new if name not in old}
+
+        by_content = {}
+        for name in sorted(deleted):
+            info = old[name]
+            by_content.setdefault((info.CRC, info.file_size), []).append(name)
+        renamed = {}
+        for name in sorted(added):
+            info = new[name]
+            candidates = by_content.get((info.CRC, info.file_size))
+            if candidates:
+                renamed[name] = candidates.pop(0)
+        deleted -= set(renamed.values())
+
+        def stats(old_name, new_name):
+            name = new_name or old_name
+            if not wants_lines(name):
+                return "-", "-"
+            # Peek first, big binaries like classes.dex never need to be inflated in full
+            for zf, entry in ((zf1, old_name), (zf2, new_name)):
+                if entry is not None:
+                    with zf.open(entry) as f:
+                        if is_binary(f.read(BINARY_SNIFF_BYTES)):
+                            return "-", "-"
+            return line_stats(zf1.read(old_name) if old_name else None,
+                              zf2.read(new_name) if new_name else None)
+
+        changes = []
+        for name in sorted(set(old) | set(new)):
+            if name in renamed:
+                changes.append((name, "modified", "0", "0"))
+            elif name in deleted:
+                changes.append((name, "deleted") + stats(name, None))
+            elif name in added:
+                changes.append((name, "added") + stats(None, name))
+            elif name in old and name in new:
+                o, n = old[name], new[name]
+                if o.CRC == n.CRC and o.file_size == n.file_size:
+                    continue
+                changes.append((name, "modified") + stats(name, name))
+        return changes
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: zip_diff.py <old.apk> <new.apk>")
+        sys.exit(1)
+
+    for name, change_type, added, removed in diff_archives(sys.argv[1], sys.argv[2]):
+        print(f"{added}\t{removed}\t{change_type}\t{name}")